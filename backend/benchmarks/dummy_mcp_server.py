@@ -0,0 +1,24 @@
+"""
+Minimal stdio MCP server used by the benchmarks.
+
+The `work` tool blocks the server for DUMMY_MCP_TOOL_LATENCY seconds, so a single
+process handles one call at a time, like a real server doing I/O synchronously.
+"""
+import os
+import time
+from mcp.server.fastmcp import FastMCP
+
+DUMMY_MCP_TOOL_LATENCY = float(os.getenv("DUMMY_MCP_TOOL_LATENCY", "0.05"))
+
+mcp = FastMCP("dummy", log_level="WARNING")
+
+
+@mcp.tool()
+def work(payload: str = "") -> str:
+    """Simulate a tool call that keeps the server busy"""
+    time.sleep(DUMMY_MCP_TOOL_LATENCY)
+    return f"done {payload}"
+
+
+if __name__ == "__main__":
+    mcp.run()
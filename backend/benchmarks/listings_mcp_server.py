@@ -0,0 +1,32 @@
+"""
+Stdio MCP server with an airbnb_search tool that returns a large JSON payload,
+standing in for the Airbnb server when recording benchmark traffic.
+"""
+import json
+import os
+from mcp.server.fastmcp import FastMCP
+
+# Listings returned by every search
+LISTINGS_COUNT = int(os.getenv("LISTINGS_COUNT", "200"))
+
+mcp = FastMCP("listings", log_level="WARNING")
+
+
+@mcp.tool()
+def airbnb_search(location: str, adults: int = 2) -> str:
+    """Search Airbnb listings for a location"""
+    listings = [
+        {
+            "name": f"{location} stay {i}",
+            "description": f"Listing {i} in {location} for up to {adults + i % 4} guests. " * 3,
+            "price": 40 + (i * 37) % 300,
+            "url": f"https://www.airbnb.com/rooms/{100000 + i}",
+            "rating": round(3.5 + (i % 15) / 10, 1),
+        }
+        for i in range(LISTINGS_COUNT)
+    ]
+    return json.dumps({"location": location, "listings": listings})
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,60 @@
+"""
+Load test for the async Anthropic path in MCPHost against a local stub model server.
+
+Usage (from the backend directory):
+    python -m benchmarks.llm_load_test --concurrency 1 5 10 25 --requests 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stub_model_server import start_stub_server, stop_stub_server
+from message_log import MessageLog
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8765
+
+
+async def run_level(mcp_host, concurrency: int, total_requests: int) -> float:
+    """Send `total_requests` model calls with at most `concurrency` in flight, return requests/sec."""
+    semaphore = asyncio.Semaphore(concurrency)
+    messages = MessageLog("ping")
+
+    async def one_request():
+        async with semaphore:
+            await mcp_host._create_claude_message(messages, [], "You are a stub.")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(total_requests)))
+    elapsed = time.perf_counter() - start
+    return total_requests / elapsed
+
+
+async def main(concurrency_levels, total_requests: int, latency: float):
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://{STUB_HOST}:{STUB_PORT}"
+    os.environ.setdefault("ANTHROPIC_API_KEY", "stub-key")
+
+    # Imported after the environment is set so the client picks up the stub base URL
+    from host import MCPHost
+
+    server = await start_stub_server(STUB_HOST, STUB_PORT, latency)
+    mcp_host = MCPHost(enabled_clients=[])
+    try:
+        print(f"Stub model latency: {latency}s, requests per level: {total_requests}")
+        print(f"{'concurrency':>12} {'req/s':>10}")
+        for concurrency in concurrency_levels:
+            rps = await run_level(mcp_host, concurrency, total_requests)
+            print(f"{concurrency:>12} {rps:>10.2f}")
+    finally:
+        await mcp_host.anthropic.close()
+        await stop_stub_server(server)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 10, 25])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.requests, args.latency))
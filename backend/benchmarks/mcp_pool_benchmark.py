@@ -0,0 +1,61 @@
+"""
+Benchmark MCP tool throughput against pool size using a local dummy MCP server.
+
+Usage (from the backend directory):
+    python -m benchmarks.mcp_pool_benchmark --pool-sizes 1 2 4 --calls 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from mcp import StdioServerParameters
+from mcp_client import MCPClient
+
+DUMMY_SERVER_PATH = os.path.join(os.path.dirname(__file__), "dummy_mcp_server.py")
+
+
+class DummyMCPClient(MCPClient):
+    def __init__(self, pool_size: int):
+        super().__init__(name="Dummy", pool_size=pool_size)
+
+    def get_server_parameters(self, server_script_path: str) -> StdioServerParameters:
+        return StdioServerParameters(
+            command=sys.executable, args=[server_script_path], env=os.environ.copy()
+        )
+
+
+async def run_pool(pool_size: int, total_calls: int, concurrency: int) -> float:
+    """Return tool calls/sec for a client with `pool_size` server processes"""
+    client = DummyMCPClient(pool_size)
+    await client.connect_to_server(DUMMY_SERVER_PATH)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_call(i: int):
+        async with semaphore:
+            await client.call_tool("work", {"payload": str(i)})
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(one_call(i) for i in range(total_calls)))
+        return total_calls / (time.perf_counter() - start)
+    finally:
+        await client.cleanup()
+
+
+async def main(pool_sizes, total_calls: int, concurrency: int):
+    print(f"{total_calls} calls, {concurrency} in flight")
+    print(f"{'pool size':>10} {'calls/s':>10}")
+    for pool_size in pool_sizes:
+        calls_per_second = await run_pool(pool_size, total_calls, concurrency)
+        print(f"{pool_size:>10} {calls_per_second:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(main(args.pool_sizes, args.calls, args.concurrency))
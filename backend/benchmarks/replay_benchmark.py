@@ -0,0 +1,106 @@
+"""
+Offline benchmark of MCPHost driven by recorded Anthropic and MCP traffic.
+
+Record a fixture first by running the app or test.py with TRAFFIC_MODE=record.
+Every agent loop run while recording becomes a scenario of the workload, and
+replaying it needs no network, API keys or MCP servers.
+
+Usage (from the backend directory):
+    python -m benchmarks.replay_benchmark --fixture traffic_fixture.json --concurrency 1 10 50 --requests 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import os
+import resource
+import time
+import tracemalloc
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+async def run_level(mcp_host, scenarios, concurrency: int, total_requests: int):
+    """Run `total_requests` agent loops with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    workload = itertools.cycle(scenarios)
+    latencies = []
+
+    async def one_request(scenario):
+        async with semaphore:
+            start = time.perf_counter()
+            await mcp_host.process_input_with_agent_loop(**scenario)
+            latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one_request(next(workload)) for _ in range(total_requests)))
+    elapsed = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "throughput": total_requests / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "peak_mb": peak_bytes / 2**20,
+    }
+
+
+async def main(fixture_path: str, concurrency_levels, total_requests: int, latency_scale: float):
+    os.environ.setdefault("ANTHROPIC_API_KEY", "stub-key")
+    os.environ["REPLAY_LATENCY_SCALE"] = str(latency_scale)
+
+    # Imported after the environment is set so replay picks up the latency scale
+    from host import MCPHost
+    from recording import TrafficFixture
+    from tool_result_cache import ToolResultCache
+
+    scenarios = TrafficFixture.load(fixture_path).scenarios
+    if not scenarios:
+        raise SystemExit(f"No scenarios recorded in {fixture_path}")
+    clients = sorted({name for scenario in scenarios for name in scenario["client_list"] or []})
+
+    mcp_host = MCPHost(
+        enabled_clients=clients, traffic_mode="replay", traffic_fixture_path=fixture_path
+    )
+    # Every run should exercise the full tool path, not the result cache
+    mcp_host.tool_result_cache = ToolResultCache(ttls={})
+    with contextlib.redirect_stdout(io.StringIO()):
+        await mcp_host.initialize_mcp_clients()
+
+    try:
+        print(
+            f"{len(scenarios)} scenario(s) on clients {clients}, latency scale {latency_scale}, "
+            f"{total_requests} requests per level"
+        )
+        print(
+            f"{'concurrency':>12} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'peak MB':>10}"
+        )
+        for concurrency in concurrency_levels:
+            stats = await run_level(mcp_host, scenarios, concurrency, total_requests)
+            print(
+                f"{concurrency:>12} {stats['throughput']:>10.2f} {stats['p50'] * 1e3:>10.2f} "
+                f"{stats['p95'] * 1e3:>10.2f} {stats['p99'] * 1e3:>10.2f} {stats['peak_mb']:>10.2f}"
+            )
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"max RSS: {max_rss_mb:.1f} MB")
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await mcp_host.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fixture", default="traffic_fixture.json")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-scale", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.fixture, args.concurrency, args.requests, args.latency_scale))
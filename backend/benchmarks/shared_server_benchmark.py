@@ -0,0 +1,137 @@
+"""
+Startup time and memory of N app workers that each spawn their own stdio MCP
+server, versus N workers sharing one warm server through mcp_bridge.py.
+
+Each worker is modelled by one ConfiguredMCPClient connecting at the same time,
+as the workers of `uvicorn --workers N` would. Memory is the resident set of
+the server processes, read from /proc, so this runs on Linux only.
+
+Usage (from the backend directory):
+    python -m benchmarks.shared_server_benchmark --workers 1 4 8
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+from benchmarks.mcp_pool_benchmark import DUMMY_SERVER_PATH
+from mcp_servers import ConfiguredMCPClient, MCPServerConfig
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STDIO_CONFIG = {
+    "script": DUMMY_SERVER_PATH,
+    "command": sys.executable,
+    "env_passthrough": ["DUMMY_MCP_TOOL_LATENCY"],
+}
+
+
+def descendants(pid: int) -> List[int]:
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            for child in f.read().split():
+                pids.append(int(child))
+                pids.extend(descendants(int(child)))
+    return pids
+
+
+def rss_mb(pids: List[int]) -> float:
+    total_kb = 0
+    for pid in pids:
+        with contextlib.suppress(FileNotFoundError), open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    total_kb += int(line.split()[1])
+    return total_kb / 1024
+
+
+async def start_workers(config: MCPServerConfig, workers: int, calls_per_worker: int):
+    clients = [ConfiguredMCPClient(config, pool_size=1) for _ in range(workers)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(client.connect_to_server(None) for client in clients))
+    startup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            client.call_tool("work", {"payload": str(i)})
+            for client in clients
+            for i in range(calls_per_worker)
+        )
+    )
+    calls_per_second = workers * calls_per_worker / (time.perf_counter() - start)
+    return clients, startup, calls_per_second
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), 0.5):
+            return
+        time.sleep(0.1)
+    raise SystemExit(f"mcp_bridge.py did not start listening on port {port}")
+
+
+async def main(worker_counts: List[int], calls_per_worker: int, port: int, bridge_pool_size: int):
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"Dummy": STDIO_CONFIG}, f)
+    bridge = subprocess.Popen(
+        [
+            sys.executable, "mcp_bridge.py", "Dummy",
+            "--port", str(port), "--pool-size", str(bridge_pool_size),
+        ],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "MCP_SERVERS_CONFIG": f.name},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        bridge_pids = [bridge.pid] + descendants(bridge.pid)
+        shared_mb = rss_mb(bridge_pids)
+        print(
+            f"shared bridge and its {bridge_pool_size} server process(es): {shared_mb:.1f} MB RSS, started once"
+        )
+        print(
+            f"{'mode':>8} {'workers':>8} {'startup s':>10} {'calls/s':>10} {'servers':>8} {'server MB':>10} {'MB/worker':>10}"
+        )
+        modes = {
+            "stdio": MCPServerConfig(name="Dummy", **STDIO_CONFIG),
+            "shared": MCPServerConfig(name="Dummy", url=f"http://127.0.0.1:{port}/mcp/"),
+        }
+        for workers in worker_counts:
+            for mode, config in modes.items():
+                clients, startup, calls_per_second = await start_workers(
+                    config, workers, calls_per_worker
+                )
+                # Server processes the workers spawned themselves
+                servers = [pid for pid in descendants(os.getpid()) if pid not in bridge_pids]
+                server_mb = rss_mb(servers)
+                print(
+                    f"{mode:>8} {workers:>8} {startup:>10.3f} {calls_per_second:>10.1f} "
+                    f"{len(servers):>8} {server_mb:>10.1f} {server_mb / workers:>10.1f}"
+                )
+                await asyncio.gather(*(client.cleanup() for client in clients))
+    finally:
+        bridge.terminate()
+        bridge.wait()
+        os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--calls", type=int, default=20, help="Tool calls per worker")
+    parser.add_argument("--port", type=int, default=8931)
+    parser.add_argument("--bridge-pool-size", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.workers, args.calls, args.port, args.bridge_pool_size))
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Simulated model latency in seconds for every /v1/messages call
+STUB_MODEL_LATENCY = float(os.getenv("STUB_MODEL_LATENCY", "0.5"))
+
+
+def create_stub_app(latency: float = STUB_MODEL_LATENCY) -> FastAPI:
+    """Create a FastAPI app that mimics the Anthropic messages endpoint.
+
+    Every request sleeps for `latency` seconds and then returns a single text block,
+    so the load on the host is dominated by network wait just like the real API.
+    Streaming requests get the same message as a sequence of SSE events.
+    """
+    app = FastAPI(title="Stub Model Server")
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        message = {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub-model"),
+            "content": [{"type": "text", "text": "stub response"}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": 10,
+                "output_tokens": 2,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": 0,
+            },
+        }
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream_events(message), media_type="text/event-stream"
+            )
+        return message
+
+    return app
+
+
+async def _stream_events(message: dict):
+    """Yield a message as the SSE events of the streaming messages API"""
+    text = message["content"][0]["text"]
+    events = [
+        ("message_start", {"message": {**message, "content": [], "stop_reason": None}}),
+        ("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}}),
+    ]
+    events += [
+        ("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": chunk}})
+        for chunk in (text[i : i + 4] for i in range(0, len(text), 4))
+    ]
+    events += [
+        ("content_block_stop", {"index": 0}),
+        (
+            "message_delta",
+            {
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": message["usage"]["output_tokens"]},
+            },
+        ),
+        ("message_stop", {}),
+    ]
+    for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps({'type': event, **data})}\n\n"
+
+
+async def start_stub_server(
+    host: str = "127.0.0.1", port: int = 8765, latency: float = STUB_MODEL_LATENCY
+) -> uvicorn.Server:
+    """Start the stub server in the current event loop and wait until it accepts requests."""
+    config = uvicorn.Config(
+        create_stub_app(latency), host=host, port=port, log_level="warning"
+    )
+    server = uvicorn.Server(config)
+    server.install_signal_handlers = lambda: None
+    server.task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def stop_stub_server(server: uvicorn.Server) -> None:
+    server.should_exit = True
+    await server.task
+
+
+if __name__ == "__main__":
+    uvicorn.run(create_stub_app(), host="127.0.0.1", port=8765)
@@ -0,0 +1,143 @@
+"""
+Measure the telemetry cost on the agent loop's critical path.
+
+Telemetry goes to a deliberately slow exporter, so any blocking export would
+show up directly in the numbers.
+
+Usage (from the backend directory):
+    python -m benchmarks.telemetry_overhead --turns 200 --export-delay 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import time
+
+from anthropic.types import Message, TextBlock, ToolUseBlock, Usage
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "stub-key")
+
+from budget import RequestBudget
+from host import MCPHost
+from telemetry import TelemetryPipeline
+
+
+class SlowExporter:
+    """Exporter that simulates a slow tracing backend"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def export(self, batch):
+        time.sleep(self.delay)
+
+
+class InstantMessages:
+    """Stands in for the Anthropic messages API: asks for `turns` local tool calls, then answers"""
+
+    def __init__(self, turns: int):
+        self.turns = turns
+        self.calls = 0
+
+    async def create(self, **request):
+        self.calls += 1
+        usage = Usage(input_tokens=10, output_tokens=2)
+        if self.calls <= self.turns:
+            content = [
+                ToolUseBlock(
+                    type="tool_use",
+                    id=f"toolu_{self.calls}",
+                    name="reference_tool_output",
+                    input={"tool_id": "missing"},
+                )
+            ]
+            stop_reason = "tool_use"
+        else:
+            content = [TextBlock(type="text", text="{}")]
+            stop_reason = "end_turn"
+        return Message(
+            id=f"msg_{self.calls}",
+            type="message",
+            role="assistant",
+            model="stub-model",
+            content=content,
+            stop_reason=stop_reason,
+            usage=usage,
+        )
+
+
+
+def bench_record(telemetry: TelemetryPipeline, count: int):
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        telemetry.record("tool", session_id="bench", name=f"tool-{i}")
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.mean(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+class StubAnthropic:
+    def __init__(self, turns: int):
+        self.messages = InstantMessages(turns)
+
+    async def close(self):
+        pass
+
+
+async def run_agent_loop(mcp_host: MCPHost, turns: int) -> float:
+    mcp_host.anthropic = StubAnthropic(turns)
+    # Room for every scripted tool turn plus the answer, so the budget doesn't cut the loop short
+    budget = RequestBudget(max_turns=turns + 2, deadline=float("inf"))
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await mcp_host.process_input_with_agent_loop(
+            input_action="benchmark",
+            system_prompt="You are a stub.",
+            langfuse_session_id="bench",
+            budget=budget,
+        )
+    elapsed = time.perf_counter() - start
+    calls = mcp_host.anthropic.messages.calls
+    assert calls == turns + 1 and budget.outcome == "ok", (
+        f"agent loop made {calls} model calls for {turns} turns (budget outcome {budget.outcome})"
+    )
+    return elapsed
+
+
+async def bench_agent_loop(turns: int, export_delay: float) -> float:
+    """Return the mean wall time per agent loop iteration, in seconds"""
+    mcp_host = MCPHost(enabled_clients=[], anthropic_client=StubAnthropic(turns))
+    mcp_host.telemetry = TelemetryPipeline(exporter=SlowExporter(export_delay), batch_size=10)
+
+    # Warm up imports and lazily created clients before measuring
+    await run_agent_loop(mcp_host, 1)
+    elapsed = await run_agent_loop(mcp_host, turns)
+
+    print(f"telemetry stats: {mcp_host.telemetry.stats()}")
+    await mcp_host.cleanup()
+    return elapsed / (turns + 1)
+
+
+def main(turns: int, records: int, export_delay: float):
+    telemetry = TelemetryPipeline(
+        exporter=SlowExporter(export_delay), queue_size=1000, batch_size=100
+    )
+    mean, p99 = bench_record(telemetry, records)
+    print(f"record(): mean {mean * 1e6:.1f}us, p99 {p99 * 1e6:.1f}us, {telemetry.stats()}")
+    telemetry.close()
+
+    per_iteration = asyncio.run(bench_agent_loop(turns, export_delay))
+    verdict = "OK" if per_iteration < 1e-3 else "OVER BUDGET"
+    print(f"agent loop: {per_iteration * 1e3:.3f}ms per iteration ({verdict}, budget 1ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--export-delay", type=float, default=0.05)
+    args = parser.parse_args()
+    main(args.turns, args.records, args.export_delay)
@@ -0,0 +1,211 @@
+"""
+Throughput of the app's request handling and JSON post-processing as uvicorn
+workers are added.
+
+A scripted model and benchmarks/listings_mcp_server.py are recorded once into a
+traffic fixture: each /airbnb request searches, narrows the large JSON result
+down with reference_tool_output and answers with JSON. The app is then served
+by serve.py in replay mode with 1, 2, 4... workers and loaded over HTTP, so
+the work measured is FastAPI, the agent loop, fixture lookups and the JSON
+handling, without model or MCP server latency. Throughput only scales up to
+the number of free CPU cores; the load generator processes need cores too.
+
+Usage (from the backend directory):
+    python -m benchmarks.worker_scaling_benchmark --workers 1 2 4 --requests 400 --concurrency 32
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LISTINGS_SERVER_PATH = os.path.join(BACKEND_DIR, "benchmarks", "listings_mcp_server.py")
+EXTRACT_PATH = "listings[?price<150]{name,price,url}"
+
+
+def trip_info(i: int) -> Dict[str, str]:
+    """Distinct trips, so requests aren't coalesced or served from a cache"""
+    return {
+        "title": f"Trip {i}",
+        "requirements": "A quiet place near the beach for a group of friends",
+        "names": ["Ana", "Ben", "Chloe"],
+        "destination": f"Lisbon {i}",
+        "duration": "5 days",
+        "dates": "June",
+        "budget": "150 EUR per night",
+    }
+
+
+class ScriptedMessages:
+    """Stands in for the messages API: search, then narrow the result down, then answer"""
+
+    async def create(self, **request):
+        from anthropic.types import Message, TextBlock, ToolUseBlock, Usage
+
+        turn = sum(1 for message in request["messages"] if message["role"] == "assistant")
+        if turn == 0:
+            content = [
+                ToolUseBlock(
+                    type="tool_use", id="toolu_search", name="airbnb_search",
+                    input={"location": "Lisbon", "adults": 3},
+                )
+            ]
+        elif turn == 1:
+            content = [
+                ToolUseBlock(
+                    type="tool_use", id="toolu_reference", name="reference_tool_output",
+                    input={"tool_id": "toolu_search", "extract_path": EXTRACT_PATH},
+                )
+            ]
+        else:
+            listings = json.loads(request["messages"][-1]["content"][0]["content"])
+            content = [TextBlock(type="text", text=json.dumps({"listings": listings[:20]}))]
+        return Message(
+            id=f"msg_{turn}", type="message", role="assistant", model=request["model"],
+            content=content, stop_reason="tool_use" if turn < 2 else "end_turn",
+            usage=Usage(input_tokens=1000, output_tokens=100),
+        )
+
+
+class ScriptedAnthropic:
+    messages = ScriptedMessages()
+
+    async def close(self):
+        pass
+
+
+async def record_fixture(fixture_path: str, trips: int) -> None:
+    from host import MCPHost
+    from main import _airbnb_loop_kwargs
+    from models import TripInfo
+
+    mcp_host = MCPHost(
+        enabled_clients=["Airbnb"],
+        anthropic_client=ScriptedAnthropic(),
+        traffic_mode="record",
+        traffic_fixture_path=fixture_path,
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        await mcp_host.initialize_mcp_clients()
+        for i in range(trips):
+            await mcp_host.process_input_with_agent_loop(
+                **_airbnb_loop_kwargs(TripInfo(**trip_info(i)))
+            )
+        await mcp_host.cleanup()
+
+
+def run_load(args: Tuple[str, List[int], int]) -> List[float]:
+    """One load generator process: POST the given trips with `concurrency` in flight"""
+    import httpx
+
+    url, trips, concurrency = args
+
+    async def main():
+        latencies = []
+        semaphore = asyncio.Semaphore(concurrency)
+        async with httpx.AsyncClient(timeout=120) as client:
+
+            async def one_request(i):
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post(url, json=trip_info(i))
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+
+            await asyncio.gather(*(one_request(i) for i in trips))
+        return latencies
+
+    return asyncio.run(main())
+
+
+def wait_until_serving(url: str, timeout: float = 120) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(httpx.HTTPError):
+            if httpx.post(url, json=trip_info(0), timeout=10).status_code == 200:
+                return
+        time.sleep(0.5)
+    raise SystemExit(f"The app did not start serving {url}")
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def main(worker_counts: List[int], total_requests: int, concurrency: int, load_processes: int, port: int):
+    workdir = tempfile.mkdtemp(prefix="worker-scaling-")
+    fixture_path = os.path.join(workdir, "traffic_fixture.json")
+    servers_config = os.path.join(workdir, "mcp_servers.json")
+    with open(servers_config, "w") as f:
+        json.dump({"Airbnb": {"script": LISTINGS_SERVER_PATH, "command": sys.executable}}, f)
+
+    os.environ.update(
+        {
+            "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY", "stub-key"),
+            "MCP_SERVERS_CONFIG": servers_config,
+            # Every request should run its agent loop: no coalescing or tool result cache hits
+            "COALESCE_RESULT_TTL": "0",
+            "TOOL_CACHE_TTLS": "{}",
+            "CHAT_SUMMARY_SQLITE_PATH": os.path.join(workdir, "chat_summaries.db"),
+            "JOB_SQLITE_PATH": os.path.join(workdir, "jobs.db"),
+        }
+    )
+    trips = total_requests
+    print(f"Recording {trips} scenario(s) to {fixture_path}")
+    asyncio.run(record_fixture(fixture_path, trips))
+
+    url = f"http://127.0.0.1:{port}/airbnb"
+    print(f"{total_requests} requests, concurrency {concurrency}, {load_processes} load process(es), {os.cpu_count()} CPU(s)")
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'speedup':>10}")
+    baseline = None
+    for workers in worker_counts:
+        app = subprocess.Popen(
+            [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port)],
+            cwd=BACKEND_DIR,
+            env={
+                **os.environ,
+                "TRAFFIC_MODE": "replay",
+                "TRAFFIC_FIXTURE_PATH": fixture_path,
+            },
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_serving(url)
+            shares = [
+                (url, list(range(i, total_requests, load_processes)), max(concurrency // load_processes, 1))
+                for i in range(load_processes)
+            ]
+            start = time.perf_counter()
+            with multiprocessing.Pool(load_processes) as pool:
+                latencies = sorted(latency for part in pool.map(run_load, shares) for latency in part)
+            throughput = total_requests / (time.perf_counter() - start)
+        finally:
+            app.terminate()
+            app.wait()
+        baseline = baseline or throughput
+        print(
+            f"{workers:>8} {throughput:>10.1f} {percentile(latencies, 0.5) * 1e3:>10.1f} "
+            f"{percentile(latencies, 0.95) * 1e3:>10.1f} {throughput / baseline:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--load-processes", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8010)
+    args = parser.parse_args()
+    main(args.workers, args.requests, args.concurrency, args.load_processes, args.port)
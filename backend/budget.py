@@ -0,0 +1,82 @@
+import os
+import time
+from typing import Any, Dict, Optional
+from usage import RequestUsage
+
+# Model calls an agent loop may make, including the final answer it is forced to give
+AGENT_MAX_TURNS = int(os.getenv("AGENT_MAX_TURNS", "15"))
+# Seconds an agent loop may run before it must answer
+AGENT_DEADLINE = float(os.getenv("AGENT_DEADLINE", "150"))
+# Input tokens (uncached, cache writes and cache reads) an agent loop may use
+AGENT_MAX_INPUT_TOKENS = int(os.getenv("AGENT_MAX_INPUT_TOKENS", "400000"))
+# Output tokens an agent loop may generate
+AGENT_MAX_OUTPUT_TOKENS = int(os.getenv("AGENT_MAX_OUTPUT_TOKENS", "32000"))
+# Seconds a single MCP tool call may take
+MCP_TOOL_CALL_TIMEOUT = float(os.getenv("MCP_TOOL_CALL_TIMEOUT", "60"))
+
+BUDGET_EXHAUSTED_PROMPT = (
+    "The budget for this task is used up ({reason}). Do not call any more tools. "
+    "Give your final answer now, in the requested format, using the information you already have."
+)
+
+
+class RequestBudget:
+    """
+    Limits on turns, wall-clock time and tokens for one agent loop.
+
+    The loop checks exhausted() after every tool turn. Once a limit is hit the model
+    is asked for a final answer without tools, and outcome records which limit it was.
+    That final answer counts toward max_turns, so a loop makes at most max_turns model
+    calls (two when max_turns is lower and the model asks for a tool).
+    """
+
+    def __init__(
+        self,
+        max_turns: int = AGENT_MAX_TURNS,
+        deadline: float = AGENT_DEADLINE,
+        max_input_tokens: int = AGENT_MAX_INPUT_TOKENS,
+        max_output_tokens: int = AGENT_MAX_OUTPUT_TOKENS,
+        tool_call_timeout: float = MCP_TOOL_CALL_TIMEOUT,
+    ):
+        self.max_turns = max_turns
+        self.deadline = deadline
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.tool_call_timeout = tool_call_timeout
+        self.outcome = "ok"
+        self._start = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._start
+
+    def remaining(self) -> float:
+        return max(self.deadline - self.elapsed, 0)
+
+    def tool_timeout(self) -> float:
+        """Timeout for the next tool call, never (much) past the deadline"""
+        return min(self.tool_call_timeout, max(self.remaining(), 1))
+
+    def exhausted(self, usage: RequestUsage) -> Optional[str]:
+        """Name of the first limit that has been reached, or None"""
+        # Leave room for the forced final answer
+        if usage.turns + 1 >= self.max_turns:
+            return "max_turns"
+        if self.remaining() <= 0:
+            return "deadline"
+        if usage.total_input_tokens >= self.max_input_tokens:
+            return "max_input_tokens"
+        if usage.output_tokens >= self.max_output_tokens:
+            return "max_output_tokens"
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "outcome": self.outcome,
+            "elapsed": round(self.elapsed, 3),
+            "max_turns": self.max_turns,
+            "deadline": self.deadline,
+            "max_input_tokens": self.max_input_tokens,
+            "max_output_tokens": self.max_output_tokens,
+            "tool_call_timeout": self.tool_call_timeout,
+        }
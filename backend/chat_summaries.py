@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import re
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+from pydantic import ValidationError
+from compaction import content_text
+from models import TripInfo
+from sqlite_store import SQLiteKeyValueStore
+
+# SQLite file holding the per-chat summary state across restarts
+CHAT_SUMMARY_SQLITE_PATH = os.getenv("CHAT_SUMMARY_SQLITE_PATH", "chat_summaries.db")
+# Messages fetched per list_messages page when catching up on a chat
+CHAT_SUMMARY_PAGE_SIZE = int(os.getenv("CHAT_SUMMARY_PAGE_SIZE", "100"))
+# Pages fetched at most per update; beyond that the chat is summarized from scratch
+CHAT_SUMMARY_MAX_PAGES = int(os.getenv("CHAT_SUMMARY_MAX_PAGES", "5"))
+
+# Whatsapp MCP server formats every message as "[YYYY-MM-DD HH:MM:SS] Chat: ..."
+MESSAGE_TIMESTAMP_PATTERN = re.compile(r"^\[(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})\]", re.MULTILINE)
+
+CURSOR_INSTRUCTIONS = """
+    Also add these two fields to the JSON object, they are used to update the summary later:
+    'chat_jid': str, the JID of the chat you summarized
+    'last_message_timestamp': str, the timestamp of the most recent message you read, formatted as YYYY-MM-DD HH:MM:SS
+    """
+
+
+def update_input_action(previous_summary: Dict[str, Any], new_messages: str) -> str:
+    return f"""
+    You previously summarized a Whatsapp group chat for a group of friends planning a trip.
+    This was your summary:
+    {json.dumps(previous_summary)}
+
+    These messages were sent to the chat since then:
+    {new_messages}
+
+    Update the summary with the information in the new messages. Keep everything from the
+    previous summary that the new messages don't change.
+
+    Return the updated summary as a JSON serializable object with exactly the same fields.
+    return NOTHING other than the JSON object.
+    """
+
+
+def parse_summary(final_text: List[str]) -> Optional[Dict[str, Any]]:
+    """Find the last JSON object in the agent loop output"""
+    for text in reversed(final_text):
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end < start:
+            continue
+        try:
+            return json.loads(text[start : end + 1])
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def message_timestamps(messages_text: str) -> List[str]:
+    """Timestamps of the messages in list_messages output, normalized to ISO-8601"""
+    return [
+        timestamp.replace(" ", "T")
+        for timestamp in MESSAGE_TIMESTAMP_PATTERN.findall(messages_text)
+    ]
+
+
+class ChatSummaryStore:
+    """Per-chat summary state in SQLite: chat JID, last processed message and summary."""
+
+    def __init__(self, path: str = CHAT_SUMMARY_SQLITE_PATH):
+        self.path = path
+        self._store = SQLiteKeyValueStore(path, "chat_summary_state")
+
+    def get(self, chat_key: str) -> Optional[Dict[str, Any]]:
+        value = self._store.get(chat_key)
+        return json.loads(value) if value else None
+
+    def set(self, chat_key: str, chat_jid: str, cursor: str, summary: Dict[str, Any]) -> None:
+        self._store.set(
+            chat_key, json.dumps({"chat_jid": chat_jid, "cursor": cursor, "summary": summary})
+        )
+
+    def close(self) -> None:
+        self._store.close()
+
+
+class IncrementalChatSummarizer:
+    """
+    Summarizes a Whatsapp chat once, then only processes messages sent since.
+
+    The first call runs the full agent loop and stores the chat JID, the timestamp of
+    the last message read and the summary. Later calls fetch the messages after that
+    cursor directly from the Whatsapp server: if there are none the stored summary is
+    returned without calling the model, otherwise the model updates the summary from
+    the new messages alone, without tools.
+    """
+
+    def __init__(self, host, store: ChatSummaryStore = None, client_name: str = "Whatsapp"):
+        self.host = host
+        self.store = store or ChatSummaryStore()
+        self.client_name = client_name
+        self.full_runs = 0
+        self.updates = 0
+        self.unchanged = 0
+
+    async def summarize(self, chat_key: str, loop_kwargs: Dict[str, Any]) -> List[str]:
+        state = await asyncio.to_thread(self.store.get, chat_key)
+        if state is not None:
+            new_messages = await self._fetch_messages_after(state["chat_jid"], state["cursor"])
+            if new_messages is not None:
+                return await self._update(chat_key, state, new_messages, loop_kwargs)
+        return await self._full_run(chat_key, loop_kwargs)
+
+    async def _full_run(self, chat_key: str, loop_kwargs: Dict[str, Any]) -> List[str]:
+        self.full_runs += 1
+        # Keep the loop's tool calls and results, to take the cursor from the messages actually read
+        state = {"tool_results": {}, "tool_calls": []}
+        final_text = await self.host.process_input_with_agent_loop(
+            **{**loop_kwargs, "input_action": loop_kwargs["input_action"] + CURSOR_INSTRUCTIONS},
+            state=state,
+        )
+        tool_results = state["tool_results"]
+        try:
+            summary = parse_summary(final_text)
+            if summary is None:
+                return final_text
+            chat_jid = summary.pop("chat_jid", None)
+            reported_cursor = summary.pop("last_message_timestamp", None)
+            summary = self._validate(summary)
+            if summary is None:
+                return final_text
+            if not chat_jid:
+                return [json.dumps(summary)]
+
+            # Messages of this chat only; other chats' timestamps say nothing about what was read here
+            chat_messages = [
+                tool_results.text(call["id"])
+                for call in state["tool_calls"]
+                if call["name"] == "list_messages"
+                and call["input"].get("chat_jid") == chat_jid
+                and call["id"] in tool_results
+            ]
+            # A JID the tools never saw is a guess; without it the next call runs in full again
+            known_jid = bool(chat_messages) or any(
+                chat_jid in tool_results.text(tool_id) for tool_id in tool_results
+            )
+        finally:
+            tool_results.close()
+
+        cursor = self._read_cursor(chat_messages, reported_cursor)
+        if known_jid and cursor:
+            await asyncio.to_thread(self.store.set, chat_key, chat_jid, cursor, summary)
+        return [json.dumps(summary)]
+
+    @staticmethod
+    def _read_cursor(chat_messages: List[str], reported: Optional[str]) -> Optional[str]:
+        """
+        Timestamp of the newest message read from the chat. The timestamp the model
+        reports is only a fallback: one later than what it read would skip messages for good.
+        """
+        timestamps = [ts for text in chat_messages for ts in message_timestamps(text)]
+        if timestamps:
+            return max(timestamps)
+        return reported.replace(" ", "T") if reported else None
+
+    async def _update(
+        self,
+        chat_key: str,
+        state: Dict[str, Any],
+        new_messages: List[str],
+        loop_kwargs: Dict[str, Any],
+    ) -> List[str]:
+        timestamps = [ts for page in new_messages for ts in message_timestamps(page)]
+        if not timestamps:
+            self.unchanged += 1
+            return [json.dumps(state["summary"])]
+
+        self.updates += 1
+        final_text = await self.host.process_input_with_agent_loop(
+            input_action=update_input_action(state["summary"], "\n".join(new_messages)),
+            system_prompt=loop_kwargs["system_prompt"],
+            client_list=[],
+            langfuse_session_id=loop_kwargs["langfuse_session_id"],
+            task=loop_kwargs.get("task"),
+        )
+        summary = parse_summary(final_text)
+        summary = self._validate(summary) if summary is not None else None
+        if summary is None:
+            return final_text
+        # Fields the model left out of the update keep their previous value
+        summary = {**state["summary"], **summary}
+        await asyncio.to_thread(
+            self.store.set, chat_key, state["chat_jid"], max(timestamps), summary
+        )
+        return [json.dumps(summary)]
+
+    async def _fetch_messages_after(self, chat_jid: str, cursor: str) -> Optional[List[str]]:
+        """Pages of messages sent after the cursor, or None if they can't be fetched incrementally"""
+        client = self.host.mcp_clients.get(self.client_name)
+        if client is None:
+            return None
+
+        pages = []
+        semaphore = self.host.client_semaphores.get(self.client_name) or nullcontext()
+        try:
+            for page in range(CHAT_SUMMARY_MAX_PAGES):
+                async with semaphore:
+                    result = await client.call_tool(
+                        "list_messages",
+                        {
+                            "chat_jid": chat_jid,
+                            "after": cursor,
+                            "limit": CHAT_SUMMARY_PAGE_SIZE,
+                            "page": page,
+                            "include_context": False,
+                        },
+                    )
+                if result.isError:
+                    return None
+                text = content_text(result.content)
+                pages.append(text)
+                if len(message_timestamps(text)) < CHAT_SUMMARY_PAGE_SIZE:
+                    return pages
+        except Exception as e:
+            print(f"Warning: Could not fetch new messages for chat {chat_jid}: {e}")
+            return None
+        # Too much happened since the last summary, start over
+        return None
+
+    @staticmethod
+    def _validate(summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            return TripInfo.model_validate(summary).model_dump(exclude_none=True)
+        except ValidationError:
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "full_runs": self.full_runs,
+            "updates": self.updates,
+            "unchanged": self.unchanged,
+        }
+
+    def close(self) -> None:
+        self.store.close()
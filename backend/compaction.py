@@ -0,0 +1,125 @@
+import os
+from typing import Any, Container, List, Tuple
+from message_log import MessageLog
+
+# Tool results longer than this are truncated in the history (0 disables truncation)
+CONTEXT_MAX_TOOL_RESULT_CHARS = int(os.getenv("CONTEXT_MAX_TOOL_RESULT_CHARS", "8000"))
+# Estimated input tokens above which older tool results are elided (0 disables elision)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "60000"))
+# Most recent tool-using turns that are never elided
+CONTEXT_KEEP_RECENT_TURNS = int(os.getenv("CONTEXT_KEEP_RECENT_TURNS", "2"))
+# Start of the placeholder that replaces an elided tool result
+ELIDED_PREFIX = "[Elided to save context."
+
+
+def binary_placeholder(length: int) -> str:
+    """Stands in for binary data, e.g. a blob resource, wherever text is needed"""
+    return f"[{length} bytes of binary data]"
+
+
+def content_text(content: Any) -> str:
+    """Flatten tool result content (a string or a list of text blocks) into one string"""
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return binary_placeholder(len(content))
+    if isinstance(content, list):
+        parts = []
+        for block in content:
+            if isinstance(block, dict):
+                parts.append(str(block.get("text", block.get("content", ""))))
+            elif isinstance(block, (bytes, bytearray, memoryview)):
+                parts.append(binary_placeholder(len(block)))
+            elif hasattr(block, "text"):
+                parts.append(block.text)
+            else:
+                parts.append(str(block))
+        return "\n".join(parts)
+    return str(content)
+
+
+class ContextCompactor:
+    """
+    Keeps the history sent to the model small.
+
+    Large tool results are truncated when they enter the history, and once the
+    estimated context exceeds the token budget the results of older turns are
+    elided. Full results stay in the request's tool_results_context, and the
+    placeholders of stored results tell the model how to fetch them with
+    reference_tool_output.
+    """
+
+    def __init__(
+        self,
+        max_tool_result_chars: int = CONTEXT_MAX_TOOL_RESULT_CHARS,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        keep_recent_turns: int = CONTEXT_KEEP_RECENT_TURNS,
+    ):
+        self.max_tool_result_chars = max_tool_result_chars
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+
+    def compact_tool_result(self, tool_id: str, content: Any) -> Any:
+        """Truncate a tool result before it is added to the history"""
+        if not self.max_tool_result_chars:
+            return content
+        text = content_text(content)
+        if len(text) <= self.max_tool_result_chars:
+            return content
+        return (
+            text[: self.max_tool_result_chars]
+            + f"\n[Truncated {len(text) - self.max_tool_result_chars} of {len(text)} characters. "
+            f"Call reference_tool_output with tool_id='{tool_id}' and an extract_path to read the rest.]"
+        )
+
+    def compact_history(self, messages: MessageLog, stored_results: Container[str] = ()) -> Tuple[int, int]:
+        """Elide old tool results until the history fits the token budget.
+
+        stored_results holds the ids of the results reference_tool_output can read
+        back; other results (e.g. of reference_tool_output itself) can only be redone.
+        Returns the estimated token count before and after compaction.
+        """
+        before = messages.estimated_tokens
+        if not self.token_budget or before <= self.token_budget:
+            return before, before
+
+        # Turns are (assistant, user tool results) pairs after the initial user message.
+        # Messages compacted on earlier turns are skipped, so each is rewritten at most once.
+        last_elidable = len(messages) - 2 * self.keep_recent_turns
+        index = max(2, messages.compacted_until)
+        while index < last_elidable and messages.estimated_tokens > self.token_budget:
+            message = messages[index]
+            if isinstance(message["content"], list):
+                messages.replace(
+                    index,
+                    {**message, "content": self._elide(message["content"], stored_results)},
+                )
+            index += 2
+        messages.compacted_until = max(messages.compacted_until, index)
+
+        return before, messages.estimated_tokens
+
+    @staticmethod
+    def _elide(content: List[Any], stored_results: Container[str]) -> List[Any]:
+        elided_content = []
+        for block in content:
+            if block.get("type") == "tool_result" and not content_text(
+                block.get("content")
+            ).startswith(ELIDED_PREFIX):
+                tool_id = block["tool_use_id"]
+                if tool_id in stored_results:
+                    placeholder = (
+                        f"{ELIDED_PREFIX} Call reference_tool_output with "
+                        f"tool_id='{tool_id}' to read this result again.]"
+                    )
+                else:
+                    placeholder = f"{ELIDED_PREFIX} Repeat the tool call if you need this result again.]"
+                block = {
+                    "type": "tool_result",
+                    "tool_use_id": tool_id,
+                    "content": placeholder,
+                }
+            elided_content.append(block)
+        return elided_content
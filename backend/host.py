@@ -1,38 +1,129 @@
 import asyncio
+import base64
 import os
-from typing import List, Dict, Any, Tuple
-from anthropic import Anthropic
+import time
+from datetime import datetime, timezone
+from contextlib import nullcontext
+from typing import List, Dict, Any, Mapping, Tuple
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
 from langfuse.decorators import observe, langfuse_context
+from mcp.shared.exceptions import McpError
 from mcp.types import TextResourceContents, BlobResourceContents, Tool
 from mcp_client import MCPClient
-from whatsapp_client import WhatsappMCPClient
-from exa_client import ExaMCPClient
-from airbnb_client import AirbnbMCPClient
-
-
-ENABLED_CLIENTS = [
-    "Whatsapp",
-    "Exa",
-    "Airbnb"
-]
+from tool_catalog import ToolCatalog
+from tool_selection import LIST_MORE_TOOLS_NAME
+from model_routing import ModelRouter, TURN_PLAN, TURN_NO_TOOLS, TURN_FOLLOWUP, TURN_FINAL
+from tool_result_cache import ToolResultCache
+from usage import RequestUsage
+from budget import RequestBudget, BUDGET_EXHAUSTED_PROMPT
+from message_log import MessageLog
+from telemetry import TelemetryPipeline
+from recording import (
+    TRAFFIC_MODE,
+    TRAFFIC_FIXTURE_PATH,
+    TrafficFixture,
+    RecordingAnthropic,
+    ReplayAnthropic,
+    ReplayMCPClient,
+    record_mcp_client,
+)
+from compaction import ContextCompactor, content_text
+from result_store import ToolResultStore
+from metrics import (
+    current_endpoint,
+    RequestTimings,
+    AGENT_LOOP_SECONDS,
+    CLIENT_INIT_SECONDS,
+    MODEL_CALL_SECONDS,
+    RESULT_STORE_BYTES,
+    TOKENS,
+    TOOL_CALL_SECONDS,
+    TOOL_QUEUE_SECONDS,
+)
+from mcp_servers import ConfiguredMCPClient, enabled_server_names, load_server_configs
+
+# Connection pool settings for the shared Anthropic HTTP client
+ANTHROPIC_MAX_CONNECTIONS = int(os.getenv("ANTHROPIC_MAX_CONNECTIONS", "100"))
+ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+ANTHROPIC_KEEPALIVE_EXPIRY = float(os.getenv("ANTHROPIC_KEEPALIVE_EXPIRY", "30"))
+
+# Seconds each MCP client gets to spawn its servers and connect
+MCP_CLIENT_STARTUP_TIMEOUT = float(os.getenv("MCP_CLIENT_STARTUP_TIMEOUT", "60"))
+
+# Maximum number of tool calls running at once per server process of an MCP client
+MCP_CLIENT_MAX_CONCURRENT_TOOL_CALLS = int(
+    os.getenv("MCP_CLIENT_MAX_CONCURRENT_TOOL_CALLS", "4")
+)
+
+
+def create_anthropic_client(
+    max_connections: int = ANTHROPIC_MAX_CONNECTIONS,
+    max_keepalive_connections: int = ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry: float = ANTHROPIC_KEEPALIVE_EXPIRY,
+) -> AsyncAnthropic:
+    """Create an async Anthropic client backed by a pooled, keep-alive HTTP client.
+
+    A single client is shared by every agent loop so concurrent requests reuse
+    connections and overlap their network waits instead of blocking the event loop.
+    """
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+    )
+    return AsyncAnthropic(http_client=http_client)
 
 
 class MCPHost:
     def __init__(
         self,
-        enabled_clients: List[str] = ENABLED_CLIENTS,
+        enabled_clients: List[str] = None,
+        anthropic_client: AsyncAnthropic = None,
+        traffic_mode: str = TRAFFIC_MODE,
+        traffic_fixture_path: str = TRAFFIC_FIXTURE_PATH,
     ):
-        self.anthropic = Anthropic()
-
-        # Initialize all client instances but don't use them unless enabled
-        self._all_clients = {
-            "Whatsapp": WhatsappMCPClient(),
-            "Exa": ExaMCPClient(),
-            "Airbnb": AirbnbMCPClient(),
-        }
+        # In record mode every Anthropic and MCP exchange is written to a fixture file,
+        # in replay mode the fixture answers them instead of the real services
+        self.traffic_mode = traffic_mode
+        self.traffic_fixture = None
+        if traffic_mode == "replay":
+            self.traffic_fixture = TrafficFixture.load(traffic_fixture_path)
+            anthropic_client = ReplayAnthropic(self.traffic_fixture)
+        elif traffic_mode == "record":
+            self.traffic_fixture = TrafficFixture(traffic_fixture_path)
+        elif traffic_mode != "live":
+            raise ValueError(f"Unknown traffic mode: {traffic_mode}")
+
+        self.anthropic = anthropic_client or create_anthropic_client()
+        if traffic_mode == "record":
+            self.anthropic = RecordingAnthropic(self.anthropic, self.traffic_fixture)
+
+        # Initialize all client instances but don't use them unless enabled.
+        # Each server's command, environment and transport come from its config.
+        server_configs = load_server_configs()
+        if traffic_mode == "replay":
+            self._all_clients = {
+                name: ReplayMCPClient(name, self.traffic_fixture)
+                for name in server_configs
+            }
+        else:
+            self._all_clients = {
+                name: ConfiguredMCPClient(config)
+                for name, config in server_configs.items()
+            }
+        if traffic_mode == "record":
+            for client in self._all_clients.values():
+                record_mcp_client(client, self.traffic_fixture)
 
-        # Use either user-specified clients or all clients by default
-        self.enabled_clients = enabled_clients
+        # Use either user-specified clients or the servers enabled in their configs
+        self.enabled_clients = (
+            enabled_server_names(server_configs) if enabled_clients is None else enabled_clients
+        )
 
         # Only include enabled clients in the active clients dict
         self.mcp_clients = {
@@ -41,21 +132,22 @@ class MCPHost:
             if name in self.enabled_clients
         }
 
-        # Only include paths for enabled clients
+        # Only include paths for enabled clients; servers reached by URL have none
         self.mcp_client_paths = {
-            "Whatsapp": os.getenv("WHATSAPP_MCP_SERVER_PATH"),
-            "Exa": os.getenv("EXA_MCP_SERVER_PATH"),
-            "Airbnb": os.getenv("AIRBNB_MCP_SERVER_PATH"),
-        }
-        self.mcp_client_paths = {
-            name: path
-            for name, path in self.mcp_client_paths.items()
+            name: config.script
+            for name, config in server_configs.items()
             if name in self.enabled_clients
         }
 
 
-        # Map of tool names to client names
-        self.tool_to_client_map: Dict[str, str] = {}
+        # Startup task of every client that has been initialized
+        self._startup_tasks: Dict[str, asyncio.Task] = {}
+
+        # Cap on concurrent tool calls per client so one turn can't flood its servers
+        self.client_semaphores: Dict[str, asyncio.Semaphore] = {
+            name: asyncio.Semaphore(MCP_CLIENT_MAX_CONCURRENT_TOOL_CALLS * client.pool_size)
+            for name, client in self.mcp_clients.items()
+        }
 
         # Add a tool reference capability that allows the LLM to reference previous tool outputs
         self.reference_tool_output = {
@@ -70,54 +162,100 @@ class MCPHost:
                     },
                     "extract_path": {
                         "type": "string",
-                        "description": "Optional JSON path to extract specific data from the tool result",
+                        "description": (
+                            "Optional JSON path to extract specific data from the tool result, "
+                            "e.g. 'results[0].title', 'results[:5]{title,url}', "
+                            "'results[*].url', 'results[?price<100]' or "
+                            "'results[?name~beach].id'. Supports keys, indices, slices, "
+                            "[*] wildcards, {field,...} projections and [?field op value] "
+                            "filters with ==, !=, <, <=, >, >= and ~ (contains)"
+                        ),
                     },
                 },
                 "required": ["tool_id"],
             },
         }
 
-    async def initialize_mcp_clients(self):
-        for client_name, client_path in self.mcp_client_paths.items():
-            print(f"Initializing {client_name} with path {client_path}")
-            await self.mcp_clients[client_name].connect_to_server(client_path)
-
-    async def get_all_tools(self, client_list: List[str] = None) -> List[Dict[str, Any]]:
-        tools, _ = await self.get_tools_from_servers(client_list)
-        server_tools = [
-            {
-                "name": tool.name,
-                "description": tool.description,
-                "input_schema": tool.inputSchema,
-            }
-            for tool in tools
-        ]
+        # Telemetry is exported in batches off the request path
+        self.telemetry = TelemetryPipeline()
+
+        # Keeps large tool results and old turns from bloating the history
+        self.compactor = ContextCompactor()
+
+        # Results of idempotent tools, shared across requests
+        self.tool_result_cache = ToolResultCache()
+
+        # Picks a fast or large model for each turn of the agent loop
+        self.model_router = ModelRouter()
+
+        # Tool definitions are listed once per client connection and reused across requests
+        self.tool_catalog = ToolCatalog(self.mcp_clients, [self.reference_tool_output])
+
+    async def initialize_mcp_clients(self, timeout: float = MCP_CLIENT_STARTUP_TIMEOUT):
+        """Start all enabled clients concurrently, each with its own timeout.
+
+        Clients that are already ready or starting are left alone, and failed ones are retried.
+        """
+        for client_name in self.mcp_client_paths:
+            task = self._startup_tasks.get(client_name)
+            if task is None or (task.done() and self.mcp_clients[client_name].state == "failed"):
+                self._startup_tasks[client_name] = asyncio.create_task(
+                    self._initialize_client(client_name, timeout)
+                )
+        await asyncio.gather(*self._startup_tasks.values())
+
+    async def _initialize_client(self, client_name: str, timeout: float):
+        client = self.mcp_clients[client_name]
+        client_path = self.mcp_client_paths[client_name]
+        client.state = "starting"
+        client.error = None
+        print(f"Initializing {client_name} with path {client_path}")
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(client.connect_to_server(client_path), timeout)
+            client.state = "ready"
+        except Exception as e:
+            client.state = "failed"
+            client.error = f"{type(e).__name__}: {e}"
+            print(f"Warning: Failed to initialize {client_name}: {client.error}")
+            await self._cleanup_client(client_name, client)
+        finally:
+            CLIENT_INIT_SECONDS.observe(
+                time.perf_counter() - start, client=client_name, status=client.state
+            )
 
-        # Add custom resource access tool
-        available_tools = server_tools + [
-            self.reference_tool_output,
+    async def wait_for_clients(self, client_list: List[str], timeout: float) -> bool:
+        """Wait up to timeout for the given clients (all if None) to finish starting; True if all are ready"""
+        if client_list is None:
+            client_list = list(self.mcp_clients)
+        pending = [
+            self._startup_tasks[name]
+            for name in client_list
+            if name in self._startup_tasks and not self._startup_tasks[name].done()
         ]
-        return available_tools
-    
-    async def get_tools_from_servers(self, client_list: List[str] = None) -> Tuple[List[Tool], Dict[str, str]]:
-        """Get all tools from all servers and map tool names to client names"""
-        tools: List[Tool] = []
-        tool_to_client_map: Dict[str, str] = {}
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        return all(
+            name in self.mcp_clients and self.mcp_clients[name].state == "ready"
+            for name in client_list
+        )
 
-        for client_name, client in self.mcp_clients.items():
-            if client_list and client_name not in client_list:
-                continue
+    def client_states(self) -> Dict[str, Dict[str, Any]]:
+        """Startup state of every enabled client"""
+        return {
+            name: {"state": client.state, "error": client.error}
+            for name, client in self.mcp_clients.items()
+        }
 
-            response = await client.session.list_tools()
-            if response.tools:
-                for tool in response.tools:
-                    tools.append(tool)
-                    # Map this tool name to the client that provides it
-                    tool_to_client_map[tool.name] = client_name
+    async def get_all_tools(self, client_list: List[str] = None) -> List[Dict[str, Any]]:
+        """Get the Anthropic tool definitions for the given clients from the catalog"""
+        entry = await self.tool_catalog.get(client_list)
+        return entry.anthropic_tools
 
-        # Store the map in the class for later use
-        self.tool_to_client_map = tool_to_client_map
-        return tools, tool_to_client_map
+    async def get_tools_from_servers(self, client_list: List[str] = None) -> Tuple[List[Tool], Mapping[str, str]]:
+        """Get all tools from all servers and map tool names to client names"""
+        entry = await self.tool_catalog.get(client_list)
+        return entry.server_tools, entry.tool_to_client_map
 
     @observe()
     async def process_input_with_agent_loop(
@@ -127,7 +265,19 @@ class MCPHost:
         client_list: List[str] = None,
         langfuse_session_id: str = None,
         state: Dict = None,
+        event_queue: asyncio.Queue = None,
+        budget: RequestBudget = None,
+        task: str = None,
     ):
+        """
+        Run the model and its tool calls until the model returns a final answer.
+
+        If an event_queue is given, model text deltas and tool call start/end events
+        are put on it as {"event": ..., "data": ...} dicts while the loop runs.
+        Once the budget (default limits unless given) runs out, the model is asked
+        for a final answer without tools. The task (e.g. "airbnb") picks the model
+        routes and the output contract a fast answer must meet.
+        """
         # Use provided system prompt or fall back to the instance variable
         current_system_prompt = (
             system_prompt
@@ -138,179 +288,446 @@ class MCPHost:
             current_step = state["current_plan"][0]
             langfuse_context.update_current_observation(name=f"{current_step}")
 
+        # Model turns and tool calls are attached to this trace by the telemetry pipeline
+        if langfuse_session_id:
+            langfuse_context.update_current_trace(session_id=langfuse_session_id)
+
+        # Wall time split into model calls, tool calls and host overhead
+        timings = RequestTimings()
+
         # Prepare query with available resources information
         print(f"Running the following input action: {input_action}")
+        if self.traffic_mode == "record":
+            self.traffic_fixture.add_scenario(
+                input_action=input_action, system_prompt=system_prompt, client_list=client_list
+            )
 
         # Initialize conversation context
-        tool_results_context = {}
-        messages = [{"role": "user", "content": input_action}]
+        tool_results_context = ToolResultStore()
+        messages = MessageLog(input_action)
+
+        # Get available tools. The catalog entry is immutable, so routing for this
+        # request can't be changed by concurrent requests for other clients.
+        tools_entry = await self.tool_catalog.get(client_list)
+        tool_to_client_map = tools_entry.tool_to_client_map
+        # Only the tools most relevant to the task are sent; the rest via list_more_tools
+        tool_selection = tools_entry.select(input_action)
+        available_tools = tool_selection.anthropic_tools
 
-        # Get available tools
-        await self.get_tools_from_servers(client_list)
-        available_tools = await self.get_all_tools(client_list)
+        # Token usage and prompt cache savings across all turns of this request
+        usage = RequestUsage()
+        budget = budget or RequestBudget()
 
         # Initial Claude API call
         print("Initial Claude API call")
-        response = await self._create_claude_message(
-            messages, available_tools, current_system_prompt, langfuse_session_id
-        )
+        with timings.model():
+            response = await self._create_claude_message(
+                messages,
+                available_tools,
+                current_system_prompt,
+                langfuse_session_id,
+                usage,
+                event_queue,
+                turn=TURN_PLAN if tool_to_client_map else TURN_NO_TOOLS,
+                task=task,
+            )
 
         # Process response and handle tool calls
         final_text = []
 
         # Continue processing until we have a complete response
         while True:
-            assistant_message_content = []
-            has_tool_calls = False
+            tool_calls = []
 
             print(f"Parsing claude response")
             for content in response.content:
                 if content.type == "text":
                     final_text.append(content.text)
-                    assistant_message_content.append(content)
                 elif content.type == "tool_use":
-                    has_tool_calls = True
-                    tool_name = content.name
-                    tool_args = content.input
-                    tool_id = content.id
-
-                    # Process the specific tool call
-                    print(f"Processing tool call: {tool_name}")
-                    updated_messages, result_content = await self._process_tool_call(
-                        tool_name,
-                        tool_args,
-                        tool_id,
-                        content,
-                        assistant_message_content,
-                        messages,
-                        tool_results_context,
-                        final_text,
-                        langfuse_session_id,
-                    )
+                    tool_calls.append(content)
 
-                    # Update conversation context
-                    messages = updated_messages
-                    if result_content:
-                        tool_results_context[tool_id] = result_content
+            # If there are no more tool calls, add the final text and break the loop
+            if not tool_calls:
+                if len(response.content) > 0 and response.content[0].type == "text":
+                    final_text.append(response.content[0].text)
+                break
 
-                    # Get next response from Claude after a tool call
-                    response = await self._create_claude_message(
-                        messages,
-                        available_tools,
-                        current_system_prompt,
+            # Run every tool the model asked for in this turn concurrently
+            print(f"Processing {len(tool_calls)} tool call(s): {[c.name for c in tool_calls]}")
+            tool_texts = [[] for _ in tool_calls]
+
+            async def run_tool_call(content, tool_text):
+                await self._emit(
+                    event_queue,
+                    "tool_call_start",
+                    {"id": content.id, "name": content.name, "input": content.input},
+                )
+                if content.name == LIST_MORE_TOOLS_NAME:
+                    result = (tool_selection.list_more(content.input.get("query")), None)
+                else:
+                    result = await self._process_tool_call(
+                        content.name,
+                        content.input,
+                        content.id,
+                        tool_to_client_map,
+                        tool_results_context,
+                        tool_text,
                         langfuse_session_id,
+                        budget.tool_timeout(),
                     )
+                await self._emit(
+                    event_queue, "tool_call_end", {"id": content.id, "name": content.name}
+                )
+                return result
+
+            with timings.tools(len(tool_calls)):
+                results = await asyncio.gather(
+                    *(
+                        run_tool_call(content, tool_text)
+                        for content, tool_text in zip(tool_calls, tool_texts)
+                    )
+                )
+
+            # list_more_tools may have unlocked tools for the next turn
+            available_tools = tool_selection.anthropic_tools
+
+            # Send all tool results back together in a single user message
+            tool_result_blocks = []
+            for content, tool_text, (tool_result, result_content) in zip(
+                tool_calls, tool_texts, results
+            ):
+                final_text.extend(tool_text)
+                if result_content:
+                    tool_results_context[content.id] = result_content
+                if state is not None and "tool_calls" in state:
+                    state["tool_calls"].append(
+                        {"id": content.id, "name": content.name, "input": content.input}
+                    )
+                # Only results reference_tool_output can read back are truncated; that excludes
+                # referenced data, which the model explicitly asked for
+                if content.id in tool_results_context:
+                    tool_result = self.compactor.compact_tool_result(content.id, tool_result)
+                tool_result_blocks.append(
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": content.id,
+                        "content": tool_result,
+                    }
+                )
+
+            # Out of budget: tell the model to answer and don't let it call tools again
+            exhausted = budget.exhausted(usage)
+            if exhausted:
+                print(f"Budget exhausted ({exhausted}), asking for a final answer")
+                budget.outcome = exhausted
+                tool_result_blocks.append(
+                    {"type": "text", "text": BUDGET_EXHAUSTED_PROMPT.format(reason=exhausted)}
+                )
+
+            messages.append_turn(response.content, tool_result_blocks)
+            tokens_before, tokens_after = self.compactor.compact_history(
+                messages, tool_results_context
+            )
+            print(
+                f"Context for next turn: ~{tokens_before} tokens before compaction, ~{tokens_after} after"
+            )
 
-                    # Break the content loop to process the new response
-                    break
-
-            # If there are no more tool calls, add the final text and break the loop
-            if not has_tool_calls:
-                if len(response.content) > 0 and response.content[0].type == "text":
-                    final_text.append(response.content[0].text)
+            # Get next response from Claude after the tool calls
+            with timings.model():
+                response = await self._create_claude_message(
+                    messages,
+                    available_tools,
+                    current_system_prompt,
+                    langfuse_session_id,
+                    usage,
+                    event_queue,
+                    tool_choice={"type": "none"} if exhausted else None,
+                    turn=TURN_FINAL if exhausted else TURN_FOLLOWUP,
+                    # Staying on one model lets later turns read the prompt cache
+                    loop_model=response.model,
+                    task=task,
+                )
+            if exhausted:
+                for content in response.content:
+                    if content.type == "text":
+                        final_text.append(content.text)
+                final_text.append(f"[Budget exhausted: {exhausted}]")
                 break
 
-        # Add a line at the end, before returning the result
+        print(
+            f"Token usage over {usage.turns} turn(s): {usage.total_input_tokens} input, "
+            f"{usage.output_tokens} output, cache hit ratio {usage.cache_hit_ratio:.0%}, "
+            f"~{usage.saved_input_tokens:.0f} input tokens saved by prompt caching"
+        )
+        AGENT_LOOP_SECONDS.observe(timings.total_seconds, endpoint=current_endpoint.get())
+        print(
+            f"Time: {timings.total_seconds:.2f}s total, {timings.model_seconds:.2f}s in model calls, "
+            f"{timings.tool_seconds:.2f}s in {timings.tool_calls} tool call(s)"
+        )
+
+        store_report = tool_results_context.to_dict()
+        RESULT_STORE_BYTES.observe(
+            store_report["peak_memory_bytes"], endpoint=current_endpoint.get(), location="memory"
+        )
+        RESULT_STORE_BYTES.observe(
+            store_report["disk_bytes"], endpoint=current_endpoint.get(), location="disk"
+        )
+        print(
+            f"Tool results: {store_report['results']} stored, peak {store_report['peak_memory_bytes'] / 1024:.0f} KiB "
+            f"in memory, {store_report['disk_bytes'] / 1024:.0f} KiB spilled to disk"
+        )
+
+        # Hand the results to the caller's state, moving spilled results without reading them back
         if state is not None and "tool_results" in state:
-            state["tool_results"].update(tool_results_context)
+            if not isinstance(state["tool_results"], ToolResultStore):
+                state["tool_results"] = ToolResultStore(state["tool_results"])
+            state["tool_results"].absorb(tool_results_context)
+        else:
+            tool_results_context.close()
+        if state is not None:
+            state["result_store"] = store_report
+            state["usage"] = usage.to_dict()
+            state["budget"] = budget.to_dict()
+            state["timings"] = timings.to_dict()
 
         return final_text
 
-    @observe(as_type="generation")
     async def _create_claude_message(
-        self, messages, available_tools, system_prompt=None, langfuse_session_id=None
+        self,
+        messages,
+        available_tools,
+        system_prompt=None,
+        langfuse_session_id=None,
+        usage: RequestUsage = None,
+        event_queue: asyncio.Queue = None,
+        tool_choice: Dict = None,
+        turn: str = TURN_PLAN,
+        loop_model: str = None,
+        task: str = None,
     ):
-        """Create a message using Claude API with the given messages and tools."""
-        system = system_prompt
-
-        # Add langfuse input tracking
-        langfuse_context.update_current_observation(
-            input=messages,
-            model="claude-3-5-sonnet-20241022",
-            session_id=langfuse_session_id,
+        """Create a message using Claude API with the given messages and tools.
+
+        The model is picked by the router from the task, the turn type and the
+        model that answered the loop's previous turn (loop_model). When an
+        event_queue is given the streaming API is used and text deltas are
+        forwarded to the queue as they arrive.
+        """
+        # Only the newest message is new in this turn; earlier ones are on previous generations
+        turn_input = messages[-1]
+        route = self.model_router.route(task, turn, loop_model)
+
+        system, messages, available_tools = self._add_cache_breakpoints(
+            system_prompt, messages, available_tools
         )
-
-        response = self.anthropic.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=4096,
+        request = dict(
+            model=route.model,
+            max_tokens=route.max_tokens,
             system=system,
             messages=messages,
             tools=available_tools,
         )
+        if tool_choice is not None:
+            request["tool_choice"] = tool_choice
 
-        # if no session id is provided, doesn't flush to langfuse
-        if langfuse_session_id:
-            langfuse_context.update_current_trace(session_id=langfuse_session_id)
-            langfuse_context.flush()
-
-            # Add cost tracking
-            langfuse_context.update_current_observation(
-                usage_details={
-                    "input": response.usage.input_tokens,
-                    "output": response.usage.output_tokens,
-                    "cache_read_input_tokens": response.usage.cache_read_input_tokens,
-                }
+        response = await self._send_claude_request(
+            request, route, turn, turn_input, langfuse_session_id, usage, event_queue
+        )
+        if route.escalate_to and self.model_router.needs_escalation(route, response):
+            print(f"Escalating {route.name} turn from {route.model} to {route.escalate_to}")
+            await self._emit(
+                event_queue, "model_escalated", {"from": route.model, "to": route.escalate_to}
+            )
+            response = await self._send_claude_request(
+                {**request, "model": route.escalate_to},
+                route,
+                turn,
+                turn_input,
+                langfuse_session_id,
+                usage,
+                event_queue,
+                escalated=True,
             )
+        return response
+
+    async def _send_claude_request(
+        self,
+        request,
+        route,
+        turn,
+        turn_input,
+        langfuse_session_id=None,
+        usage: RequestUsage = None,
+        event_queue: asyncio.Queue = None,
+        escalated: bool = False,
+    ):
+        """Send one request to the Anthropic API and record its usage, metrics and telemetry"""
+        start_time = datetime.now(timezone.utc)
+        if event_queue is None:
+            response = await self.anthropic.messages.create(**request)
+        else:
+            async with self.anthropic.messages.stream(**request) as stream:
+                async for event in stream:
+                    if event.type == "text":
+                        await self._emit(event_queue, "text", {"delta": event.text})
+                response = await stream.get_final_message()
+        end_time = datetime.now(timezone.utc)
+        if usage is not None:
+            usage.add(response.usage)
+
+        seconds = (end_time - start_time).total_seconds()
+        self.model_router.record(route, request["model"], seconds, response.usage, escalated)
+        endpoint = current_endpoint.get()
+        MODEL_CALL_SECONDS.observe(seconds, endpoint=endpoint, model=request["model"], turn=turn)
+        for token_type in (
+            "input_tokens",
+            "output_tokens",
+            "cache_read_input_tokens",
+            "cache_creation_input_tokens",
+        ):
+            TOKENS.inc(getattr(response.usage, token_type) or 0, endpoint=endpoint, type=token_type)
+
+        # The Langfuse generation is built and exported by the telemetry thread
+        self.telemetry.record(
+            "generation",
+            trace_id=langfuse_context.get_current_trace_id(),
+            parent_observation_id=langfuse_context.get_current_observation_id(),
+            session_id=langfuse_session_id,
+            start_time=start_time,
+            end_time=end_time,
+            model=response.model,
+            input=turn_input,
+            output=response.content,
+            usage_details={
+                "input": response.usage.input_tokens,
+                "output": response.usage.output_tokens,
+                "cache_read_input_tokens": response.usage.cache_read_input_tokens or 0,
+                "cache_creation_input_tokens": response.usage.cache_creation_input_tokens or 0,
+            },
+        )
 
         return response
 
-    @observe(as_type="tool")
+    async def _emit(self, event_queue: asyncio.Queue, event: str, data: Dict) -> None:
+        """Put a progress event on the queue of a streaming request, if there is one"""
+        if event_queue is not None:
+            await event_queue.put({"event": event, "data": data})
+
+    def _add_cache_breakpoints(self, system_prompt, messages, available_tools):
+        """
+        Mark the tools, the system prompt and the latest message as prompt cache breakpoints.
+
+        The cached prefix is tools -> system -> messages, so each turn of the agent loop
+        reads everything up to the previous turn's last message from the cache.
+        The shared tool list and the message log are left untouched: the tools are
+        copied and the history is wrapped in a view with a new last message.
+        """
+        cache_control = {"type": "ephemeral"}
+
+        tools = list(available_tools)
+        if tools:
+            tools[-1] = {**tools[-1], "cache_control": cache_control}
+
+        system = None
+        if system_prompt:
+            system = [
+                {"type": "text", "text": system_prompt, "cache_control": cache_control}
+            ]
+
+        last_message = messages[-1]
+        content = last_message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content, "cache_control": cache_control}]
+        else:
+            content = list(content)
+            if isinstance(content[-1], dict):
+                content[-1] = {**content[-1], "cache_control": cache_control}
+
+        return system, messages.with_last_message({**last_message, "content": content}), tools
+
     async def _process_tool_call(
         self,
         tool_name,
         tool_args,
         tool_id,
-        content,
-        assistant_message_content,
-        messages,
+        tool_to_client_map,
         tool_results_context,
         final_text,
         langfuse_session_id,
+        timeout=None,
     ):
-        """Process a specific tool call and return updated messages and result content."""
+        """Process a specific tool call and return the tool result and the content to store."""
+        start_time = datetime.now(timezone.utc)
+        tool_result, result_content = await self._dispatch_tool_call(
+            tool_name,
+            tool_args,
+            tool_to_client_map,
+            tool_results_context,
+            final_text,
+            timeout,
+        )
+        end_time = datetime.now(timezone.utc)
+        TOOL_CALL_SECONDS.observe(
+            (end_time - start_time).total_seconds(),
+            endpoint=current_endpoint.get(),
+            client=tool_to_client_map.get(tool_name, "host"),
+            tool=tool_name,
+        )
 
-        # Add langfuse tracking
-        if langfuse_session_id:
-            langfuse_context.update_current_observation(name=tool_name)
-            langfuse_context.update_current_trace(session_id=langfuse_session_id)
-            langfuse_context.flush()
+        # The Langfuse span is built and exported by the telemetry thread
+        self.telemetry.record(
+            "tool",
+            trace_id=langfuse_context.get_current_trace_id(),
+            parent_observation_id=langfuse_context.get_current_observation_id(),
+            session_id=langfuse_session_id,
+            start_time=start_time,
+            end_time=end_time,
+            name=tool_name,
+            tool_id=tool_id,
+            input=tool_args,
+            output=tool_result,
+        )
+        return tool_result, result_content
 
+    async def _dispatch_tool_call(
+        self,
+        tool_name,
+        tool_args,
+        tool_to_client_map,
+        tool_results_context,
+        final_text,
+        timeout=None,
+    ):
+        """Route a tool call to the matching handler"""
         if tool_name == "reference_tool_output":
             return await self._handle_reference_tool(
-                tool_id,
                 tool_args,
-                content,
-                assistant_message_content,
-                messages,
                 tool_results_context,
             )
-        elif tool_name == "access_resource":
-            return await self._handle_resource_access(
-                tool_id,
-                tool_args,
-                content,
-                assistant_message_content,
-                messages,
-                final_text,
-            )
+
+        # Hold the owning client's slot while its server works on the call
+        if tool_name == "access_resource":
+            client_name = tool_args["client"]
         else:
+            client_name = tool_to_client_map.get(tool_name)
+        queued_at = time.perf_counter()
+        async with self.client_semaphores.get(client_name, nullcontext()):
+            TOOL_QUEUE_SECONDS.observe(time.perf_counter() - queued_at, client=client_name)
+            if tool_name == "access_resource":
+                return await self._handle_resource_access(
+                    tool_args,
+                    final_text,
+                )
             return await self._handle_standard_tool(
                 tool_name,
                 tool_args,
-                tool_id,
-                content,
-                assistant_message_content,
-                messages,
+                tool_to_client_map,
                 final_text,
+                timeout,
             )
 
     async def _handle_reference_tool(
         self,
-        tool_id,
         tool_args,
-        content,
-        assistant_message_content,
-        messages,
         tool_results_context,
     ):
         """Handle reference_tool_output tool."""
@@ -319,65 +736,18 @@ class MCPHost:
         result_content = None
 
         if referenced_tool_id in tool_results_context:
-            result_content = self._extract_reference_data(
-                tool_results_context[referenced_tool_id], extract_path
-            )
+            # The store parses each result once, however often it is referenced
+            result_content = tool_results_context.extract(referenced_tool_id, extract_path)
         else:
             result_content = (
                 f"Error: No tool result found with ID '{referenced_tool_id}'"
             )
 
-        # Add tool usage to message
-        assistant_message_content.append(content)
-        updated_messages = messages.copy()
-        updated_messages.append(
-            {"role": "assistant", "content": assistant_message_content}
-        )
-
-        # Add tool result to message
-        updated_messages.append(
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "tool_result",
-                        "tool_use_id": tool_id,
-                        "content": result_content,
-                    }
-                ],
-            }
-        )
-
-        return updated_messages, None
-
-    def _extract_reference_data(self, result_content, extract_path):
-        """Extract data from a result using the given path."""
-        if not extract_path or not result_content:
-            return result_content
-
-        import json
-
-        try:
-            data = json.loads(result_content)
-            # Simple path extraction
-            parts = extract_path.split(".")
-            for part in parts:
-                if part in data:
-                    data = data[part]
-                else:
-                    data = None
-                    break
-            return json.dumps(data) if data else "Path not found in data"
-        except json.JSONDecodeError:
-            return "Cannot extract path: result is not valid JSON"
+        return result_content, None
 
     async def _handle_resource_access(
         self,
-        tool_id,
         tool_args,
-        content,
-        assistant_message_content,
-        messages,
         final_text,
     ):
         """Handle access_resource tool."""
@@ -385,70 +755,65 @@ class MCPHost:
         client_name = tool_args["client"]
 
         # Get resource from MCP server
-        resource_result = await self.mcp_clients[client_name].session.read_resource(uri)
+        try:
+            resource_result = await self.mcp_clients[client_name].read_resource(uri)
+        except McpError as e:
+            # e.g. the server process died: report it to the model instead of failing the loop
+            error_message = f"Error: Resource '{uri}' could not be read: {e.error.message}"
+            print(error_message)
+            final_text.append(error_message)
+            return error_message, error_message
         final_text.append(f"[Accessing resource {uri}]")
 
-        # Format the resource result
+        # Blobs are stored as raw bytes; the model sees a placeholder for them
         result_content = self._format_resource_content(resource_result)
 
-        # Add tool usage to message
-        assistant_message_content.append(content)
-        updated_messages = messages.copy()
-        updated_messages.append(
-            {"role": "assistant", "content": assistant_message_content}
-        )
-
-        # Add tool result to message
-        updated_messages.append(
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "tool_result",
-                        "tool_use_id": tool_id,
-                        "content": result_content,
-                    }
-                ],
-            }
-        )
-
-        return updated_messages, result_content
+        return content_text(result_content), result_content
 
     def _format_resource_content(self, resource_result):
-        """Format resource result into a string."""
+        """Split a resource result into text parts and decoded blob bytes."""
         resource_result_content = []
         for resource_content in resource_result.contents:
             if isinstance(resource_content, TextResourceContents):
                 resource_result_content.append(resource_content.text)
             elif isinstance(resource_content, BlobResourceContents):
-                resource_result_content.append(str(resource_content.blob))
+                resource_result_content.append(base64.b64decode(resource_content.blob))
 
-        return "\n".join(resource_result_content)
+        return resource_result_content
 
     async def _handle_standard_tool(
         self,
         tool_name,
         tool_args,
-        tool_id,
-        content,
-        assistant_message_content,
-        messages,
+        tool_to_client_map,
         final_text,
+        timeout=None,
     ):
         """Handle standard tools that are provided by MCP clients."""
         result_content = None
-        updated_messages = messages.copy()
 
         # Look up which client this tool belongs to
-        if tool_name in self.tool_to_client_map:
-            client_name = self.tool_to_client_map[tool_name]
+        if tool_name in tool_to_client_map:
+            client_name = tool_to_client_map[tool_name]
             client: MCPClient = self.mcp_clients[client_name]
 
             # Call the tool through the appropriate client
             print(
                 f"Calling tool {tool_name} with args {tool_args} via client {client_name}"
             )
-            result = await client.session.call_tool(tool_name, tool_args)
+            result = await self.tool_result_cache.get(client_name, tool_name, tool_args)
+            if result is None:
+                try:
+                    result = await client.call_tool(tool_name, tool_args, timeout)
+                except McpError as e:
+                    # e.g. the call timed out or the server died: report it to the model instead of failing the loop
+                    error_message = f"Error: Tool '{tool_name}' failed: {e.error.message}"
+                    print(error_message)
+                    final_text.append(error_message)
+                    return error_message, error_message
+                await self.tool_result_cache.set(client_name, tool_name, tool_args, result)
+            else:
+                print(f"Using cached result for tool {tool_name}")
             final_text.append(
                 f"[Calling tool {tool_name} with args {tool_args} via client {client_name}]"
             )
@@ -460,27 +825,7 @@ class MCPHost:
             final_text.append(error_message)
             result_content = f"Error: Tool '{tool_name}' is not available."
 
-        # Add tool usage to message
-        assistant_message_content.append(content)
-        updated_messages.append(
-            {"role": "assistant", "content": assistant_message_content}
-        )
-
-        # Add tool result to message
-        updated_messages.append(
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "tool_result",
-                        "tool_use_id": tool_id,
-                        "content": result_content,
-                    }
-                ],
-            }
-        )
-
-        return updated_messages, result_content
+        return result_content, result_content
 
     async def cleanup(self):
         cleanup_tasks = []
@@ -495,6 +840,21 @@ class MCPHost:
         if cleanup_tasks:
             await asyncio.gather(*cleanup_tasks, return_exceptions=True)
 
+        self.tool_result_cache.close()
+
+        if self.traffic_mode == "record":
+            self.traffic_fixture.save()
+            print(f"Saved recorded traffic to {self.traffic_fixture.path}")
+
+        # Export whatever telemetry is still queued
+        await asyncio.to_thread(self.telemetry.close)
+
+        # Release pooled connections held by the Anthropic client
+        try:
+            await self.anthropic.close()
+        except Exception as e:
+            print(f"Warning: Error closing Anthropic client: {e}")
+
     async def _cleanup_client(self, client_name, client):
         """Helper method to clean up a single client"""
         try:
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from metrics import JOB_QUEUE_SECONDS
+from sqlite_store import SQLiteKeyValueStore
+
+# Agent runs executed concurrently by the job workers
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Jobs waiting for a worker; new jobs are rejected once the queue is full
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+# Seconds a finished job's result stays available for polling
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+# Optional path to a SQLite file that keeps jobs across restarts and shares them between workers
+JOB_SQLITE_PATH = os.getenv("JOB_SQLITE_PATH")
+# Seconds between reads of the SQLite store while waiting for a job running in another worker
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+# Seconds between purges of expired jobs from memory, at most the result TTL
+JOB_PURGE_INTERVAL = float(os.getenv("JOB_PURGE_INTERVAL", "60"))
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = "queued"  # queued, running, succeeded or failed
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[List[str]] = None
+    error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SQLiteJobStore:
+    """On-disk store of jobs, purged once their TTL has passed. Workers of one app can share the file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._store = SQLiteKeyValueStore(path, "job_records")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        value = self._store.get(job_id)
+        return Job(**json.loads(value)) if value else None
+
+    def set(self, job: Job, expires_at: float) -> None:
+        self._store.set(job.id, json.dumps(job.to_dict()), expires_at)
+
+    def close(self) -> None:
+        self._store.close()
+
+
+class JobQueue:
+    """
+    Runs agent loops in the background so requests don't hold a connection open.
+
+    submit() queues a job and returns immediately, a fixed pool of worker tasks
+    runs the jobs, and finished jobs are kept in memory for result_ttl seconds,
+    plus in the optional SQLite store. When the queue is full, submit() raises
+    JobQueueFullError instead of letting the wait grow without bound.
+
+    The SQLite store also records every status change, so with several app
+    worker processes sharing the file, any worker can report on any job.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        queue_size: int = JOB_QUEUE_SIZE,
+        result_ttl: float = JOB_RESULT_TTL,
+        sqlite_path: str = JOB_SQLITE_PATH,
+    ):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.disk = SQLiteJobStore(sqlite_path) if sqlite_path else None
+        self.rejected = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._jobs: Dict[str, Job] = {}
+        self._done_events: Dict[str, asyncio.Event] = {}
+        self._submit_writes: Dict[str, asyncio.Task] = {}
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._worker_tasks:
+            self._worker_tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers)
+            ] + [asyncio.create_task(self._purge_loop())]
+
+    def submit(self, kind: str, func: Callable[[], Awaitable[Any]]) -> Job:
+        self._purge_expired()
+        job = Job(id=uuid.uuid4().hex, kind=kind, created_at=time.time())
+        try:
+            self._queue.put_nowait((job, func))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise JobQueueFullError(f"Job queue is full ({self._queue.maxsize} jobs waiting)")
+        self._jobs[job.id] = job
+        self._done_events[job.id] = asyncio.Event()
+        if self.disk:
+            # Written in the background; the worker waits for it so writes stay in order
+            self._submit_writes[job.id] = asyncio.create_task(
+                self._persist(Job(**job.to_dict()))
+            )
+        return job
+
+    async def get(self, job_id: str, wait: float = 0) -> Optional[Job]:
+        """Look up a job, optionally waiting up to `wait` seconds for it to finish"""
+        done_event = self._done_events.get(job_id)
+        if wait and done_event is not None:
+            try:
+                await asyncio.wait_for(done_event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+        job = self._jobs.get(job_id)
+        if job is not None and self._expired(job, time.time()):
+            del self._jobs[job_id]
+            job = None
+        if job is None and self.disk:
+            job = await self._get_shared(job_id, wait)
+        return job
+
+    async def _get_shared(self, job_id: str, wait: float) -> Optional[Job]:
+        """Read a job submitted to another worker, polling the store for up to `wait` seconds"""
+        deadline = time.monotonic() + wait
+        job = await asyncio.to_thread(self.disk.get, job_id)
+        while job is not None and not job.done and time.monotonic() < deadline:
+            await asyncio.sleep(min(JOB_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+            job = await asyncio.to_thread(self.disk.get, job_id)
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job, func = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            JOB_QUEUE_SECONDS.observe(job.started_at - job.created_at, kind=job.kind)
+            submit_write = self._submit_writes.pop(job.id, None)
+            if submit_write:
+                await submit_write
+            await self._persist(job)
+            try:
+                job.result = await func()
+                job.status = "succeeded" if job.result else "failed"
+            except Exception as e:
+                print(f"Error in job {job.id} ({job.kind}): {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._done_events.pop(job.id).set()
+                self._queue.task_done()
+            await self._persist(job)
+
+    async def _persist(self, job: Job) -> None:
+        if not self.disk:
+            return
+        try:
+            await asyncio.to_thread(
+                self.disk.set, job, (job.finished_at or time.time()) + self.result_ttl
+            )
+        except Exception as e:
+            print(f"Warning: Could not persist job {job.id}: {e}")
+
+    def _expired(self, job: Job, now: float) -> bool:
+        return job.done and job.finished_at + self.result_ttl <= now
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items() if self._expired(job, now)]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _purge_loop(self) -> None:
+        """Drop expired jobs even when no new jobs are submitted"""
+        while True:
+            # get() checks expiry itself, so a zero TTL needs no busy loop here
+            await asyncio.sleep(min(JOB_PURGE_INTERVAL, self.result_ttl) or JOB_PURGE_INTERVAL)
+            self._purge_expired()
+
+    def stats(self) -> Dict[str, Any]:
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "queue_size": self._queue.maxsize,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "succeeded": statuses.count("succeeded"),
+            "failed": statuses.count("failed"),
+            "rejected": self.rejected,
+            "sqlite_path": self.disk.path if self.disk else None,
+        }
+
+    async def close(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self.disk:
+            self.disk.close()
@@ -1,9 +1,20 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Match
+from sse_starlette.sse import EventSourceResponse
 from datetime import datetime
-from host import MCPHost, ENABLED_CLIENTS
+from host import MCPHost
 from dotenv import load_dotenv
 from models import TripInfo
+from single_flight import SingleFlight
+from chat_summaries import IncrementalChatSummarizer
+from job_queue import JobQueue, JobQueueFullError
+from metrics import REGISTRY, REQUEST_SECONDS, current_endpoint
 
 load_dotenv()
 
@@ -13,26 +24,146 @@ SYSTEM_PROMPT = """
     Your job is to perform tasks that help them plan the trip.
     """
 
-mcp_host = MCPHost(enabled_clients=ENABLED_CLIENTS)
+# Seconds a request waits for the MCP clients it needs to finish starting
+MCP_CLIENT_READY_WAIT = float(os.getenv("MCP_CLIENT_READY_WAIT", "30"))
+# Default seconds /plan waits for its searches before returning what has finished
+PLAN_DEADLINE = float(os.getenv("PLAN_DEADLINE", "180"))
+
+# Built per worker process in the lifespan hook, not at import time, so every
+# uvicorn worker gets its own Anthropic client, MCP sessions and SQLite connections
+mcp_host: MCPHost = None
+
+# Identical concurrent requests share one agent run
+single_flight = SingleFlight()
+
+# Per-chat summaries that later calls update from new messages only
+chat_summarizer: IncrementalChatSummarizer = None
+
+# Background agent runs for clients that poll for the result
+job_queue: JobQueue = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global mcp_host, chat_summarizer, job_queue
+    mcp_host = MCPHost()
+    chat_summarizer = IncrementalChatSummarizer(mcp_host)
+    job_queue = JobQueue()
+    print(f"Worker {os.getpid()} initialized")
+
+    # Start the MCP clients in the background so the app can serve requests
+    # for clients that are ready while slower servers are still spawning
+    startup_task = asyncio.create_task(mcp_host.initialize_mcp_clients())
+    job_queue.start()
+    yield
+    startup_task.cancel()
+    await job_queue.close()
+    await mcp_host.cleanup()
+    chat_summarizer.close()
 
 app = FastAPI(
     title="AI Assistant API",
     description="A simple AI Assistant",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
+def _endpoint_label(request: Request) -> str:
+    """Route template of the request, so /jobs/{job_id} is one label and not one per job"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    endpoint = _endpoint_label(request)
+    # Model and tool metrics recorded while serving this request are labeled with its endpoint
+    current_endpoint.set(endpoint)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status=str(status))
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/start")
 async def start():
     await mcp_host.initialize_mcp_clients()
     print("Initialized MCP clients")
     return JSONResponse(
         status_code=200,
-        content={"status": "healthy"}
+        content={"status": "healthy", "clients": mcp_host.client_states()}
     )
 
-@app.get("/chat-history")
-async def summarize_group_chat(chat_name: str, whatsapp_user_name: str):
-    input_action = f"""
+@app.get("/ready")
+async def ready():
+    client_states = mcp_host.client_states()
+    all_ready = all(state["state"] == "ready" for state in client_states.values())
+    return JSONResponse(
+        status_code=200 if all_ready else 503,
+        content={
+            "status": "ready" if all_ready else "starting",
+            "worker": os.getpid(),
+            "clients": client_states,
+        }
+    )
+
+def _normalize(value: str) -> str:
+    """Normalize user input for request coalescing: collapse whitespace, ignore case"""
+    return " ".join(value.split()).casefold() if value else ""
+
+def _trip_info_key(trip_info: TripInfo):
+    return tuple(
+        (field, tuple(_normalize(v) for v in value) if isinstance(value, list) else _normalize(value))
+        for field, value in sorted(trip_info.model_dump().items())
+    )
+
+async def _clients_not_ready(client_list):
+    """Return a 503 response if the clients a request needs are not ready in time"""
+    if await mcp_host.wait_for_clients(client_list, MCP_CLIENT_READY_WAIT):
+        return None
+    return JSONResponse(
+        status_code=503,
+        content={"status": "error", "clients": mcp_host.client_states()}
+    )
+
+@app.get("/tool-cache")
+async def tool_cache_stats():
+    return JSONResponse(
+        status_code=200,
+        content=mcp_host.tool_result_cache.stats()
+    )
+
+@app.get("/model-routes")
+async def model_route_stats():
+    return JSONResponse(
+        status_code=200,
+        content=mcp_host.model_router.stats()
+    )
+
+@app.get("/coalescing")
+async def coalescing_stats():
+    return JSONResponse(
+        status_code=200,
+        content=single_flight.stats()
+    )
+
+@app.get("/chat-summaries")
+async def chat_summary_stats():
+    return JSONResponse(
+        status_code=200,
+        content=chat_summarizer.stats()
+    )
+
+def chat_history_input_action(chat_name: str, whatsapp_user_name: str) -> str:
+    return f"""
     Summarize the chat history for the group chat: {chat_name}
 
     IGNORE EMOJIS. You can fuzzy match in case of spelling mistakes.
@@ -58,14 +189,29 @@ async def summarize_group_chat(chat_name: str, whatsapp_user_name: str):
     return NOTHING other than the JSON object.
     """
 
-    client_list = ["Whatsapp"]
-    result = await mcp_host.process_input_with_agent_loop(
-        input_action=input_action,
+def _chat_history_loop_kwargs(chat_name: str, whatsapp_user_name: str):
+    return dict(
+        input_action=chat_history_input_action(chat_name, whatsapp_user_name),
         system_prompt=SYSTEM_PROMPT,
-        client_list=client_list,
+        client_list=["Whatsapp"],
+        task="chat_history",
         langfuse_session_id=f"chat-history-{chat_name}-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
     )
 
+def _run_chat_history(chat_name: str, whatsapp_user_name: str, loop_kwargs):
+    chat_key = f"{_normalize(chat_name)}|{_normalize(whatsapp_user_name)}"
+    return single_flight.run(
+        ("chat-history", chat_key),
+        lambda: chat_summarizer.summarize(chat_key, loop_kwargs),
+    )
+
+@app.get("/chat-history")
+async def summarize_group_chat(chat_name: str, whatsapp_user_name: str):
+    loop_kwargs = _chat_history_loop_kwargs(chat_name, whatsapp_user_name)
+    if not_ready := await _clients_not_ready(loop_kwargs["client_list"]):
+        return not_ready
+    result = await _run_chat_history(chat_name, whatsapp_user_name, loop_kwargs)
+
     if result:
         return JSONResponse(
             status_code=200,
@@ -74,9 +220,15 @@ async def summarize_group_chat(chat_name: str, whatsapp_user_name: str):
     else:
         return JSONResponse(status_code=500, content={"status": "error"})
 
-@app.post("/airbnb")
-async def airbnb(trip_info: TripInfo):
-    input_action = f"""
+@app.get("/chat-history/stream")
+async def stream_summarize_group_chat(chat_name: str, whatsapp_user_name: str):
+    loop_kwargs = _chat_history_loop_kwargs(chat_name, whatsapp_user_name)
+    if not_ready := await _clients_not_ready(loop_kwargs["client_list"]):
+        return not_ready
+    return _stream_agent_loop(loop_kwargs)
+
+def airbnb_input_action(trip_info: TripInfo) -> str:
+    return f"""
     You are given a list of requirements for a group of friends planning a trip together.
     Based on the requirements, you need to find a place to stay for the trip.
     You have access to tools from Airbnb that you can use to search.
@@ -98,14 +250,28 @@ async def airbnb(trip_info: TripInfo):
     {trip_info}
     """
 
-    client_list = ["Airbnb"]
-    result = await mcp_host.process_input_with_agent_loop(
-        input_action=input_action,
+def _airbnb_loop_kwargs(trip_info: TripInfo):
+    return dict(
+        input_action=airbnb_input_action(trip_info),
         system_prompt=SYSTEM_PROMPT,
-        client_list=client_list,
+        client_list=["Airbnb"],
+        task="airbnb",
         langfuse_session_id=f"airbnb-{trip_info.title}-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
     )
 
+def _run_airbnb(trip_info: TripInfo, loop_kwargs):
+    return single_flight.run(
+        ("airbnb", _trip_info_key(trip_info)),
+        lambda: mcp_host.process_input_with_agent_loop(**loop_kwargs),
+    )
+
+@app.post("/airbnb")
+async def airbnb(trip_info: TripInfo):
+    loop_kwargs = _airbnb_loop_kwargs(trip_info)
+    if not_ready := await _clients_not_ready(loop_kwargs["client_list"]):
+        return not_ready
+    result = await _run_airbnb(trip_info, loop_kwargs)
+
     if result:
         return JSONResponse(
             status_code=200,
@@ -113,10 +279,16 @@ async def airbnb(trip_info: TripInfo):
         )
     else:
         return JSONResponse(status_code=500, content={"status": "error"})
-    
-@app.post("/activities")
-async def activities(trip_info: TripInfo):
-    input_action = f"""
+
+@app.post("/airbnb/stream")
+async def stream_airbnb(trip_info: TripInfo):
+    loop_kwargs = _airbnb_loop_kwargs(trip_info)
+    if not_ready := await _clients_not_ready(loop_kwargs["client_list"]):
+        return not_ready
+    return _stream_agent_loop(loop_kwargs)
+
+def activities_input_action(trip_info: TripInfo) -> str:
+    return f"""
     You are given a list of requirements for a group of friends planning a trip together.
     Based on the requirements, you need to find activities for the trip.
     You have access to tools from Exa that you can use to search.
@@ -139,14 +311,28 @@ async def activities(trip_info: TripInfo):
     {trip_info}
     """
 
-    client_list = ["Exa"]
-    result = await mcp_host.process_input_with_agent_loop(
-        input_action=input_action,
+def _activities_loop_kwargs(trip_info: TripInfo):
+    return dict(
+        input_action=activities_input_action(trip_info),
         system_prompt=SYSTEM_PROMPT,
-        client_list=client_list,
+        client_list=["Exa"],
+        task="activities",
         langfuse_session_id=f"activities-{trip_info.title}-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
     )
 
+def _run_activities(trip_info: TripInfo, loop_kwargs):
+    return single_flight.run(
+        ("activities", _trip_info_key(trip_info)),
+        lambda: mcp_host.process_input_with_agent_loop(**loop_kwargs),
+    )
+
+@app.post("/activities")
+async def activities(trip_info: TripInfo):
+    loop_kwargs = _activities_loop_kwargs(trip_info)
+    if not_ready := await _clients_not_ready(loop_kwargs["client_list"]):
+        return not_ready
+    result = await _run_activities(trip_info, loop_kwargs)
+
     if result:
         return JSONResponse(
             status_code=200,
@@ -155,6 +341,200 @@ async def activities(trip_info: TripInfo):
     else:
         return JSONResponse(status_code=500, content={"status": "error"})
 
+@app.post("/activities/stream")
+async def stream_activities(trip_info: TripInfo):
+    loop_kwargs = _activities_loop_kwargs(trip_info)
+    if not_ready := await _clients_not_ready(loop_kwargs["client_list"]):
+        return not_ready
+    return _stream_agent_loop(loop_kwargs)
+
+async def _run_plan_part(run, trip_info: TripInfo, loop_kwargs):
+    if not await mcp_host.wait_for_clients(loop_kwargs["client_list"], MCP_CLIENT_READY_WAIT):
+        return {"status": "unavailable", "clients": loop_kwargs["client_list"]}
+    result = await run(trip_info, loop_kwargs)
+    return {"status": "success", "result": result} if result else {"status": "error"}
+
+async def _plan(trip_info: TripInfo, deadline: float):
+    """
+    Run the Airbnb and activities searches concurrently and yield (name, part)
+    as each one finishes. Searches still running at the deadline yield a timeout.
+    """
+    tasks = {
+        asyncio.create_task(_run_plan_part(_run_airbnb, trip_info, _airbnb_loop_kwargs(trip_info))): "airbnb",
+        asyncio.create_task(_run_plan_part(_run_activities, trip_info, _activities_loop_kwargs(trip_info))): "activities",
+    }
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(end - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for task in done:
+                try:
+                    part = task.result()
+                except Exception as e:
+                    print(f"Error in plan search {tasks[task]}: {e}")
+                    part = {"status": "error"}
+                yield tasks[task], part
+        for task in pending:
+            yield tasks[task], {"status": "timeout"}
+    finally:
+        for task in pending:
+            task.cancel()
+
+def _plan_status(parts) -> str:
+    statuses = [part["status"] for part in parts.values()]
+    if all(status == "success" for status in statuses):
+        return "success"
+    if "success" in statuses:
+        return "partial"
+    # Nothing went wrong on our side, the searches just didn't finish in time
+    return "timeout" if all(status == "timeout" for status in statuses) else "error"
+
+PLAN_STATUS_CODES = {"error": 500, "timeout": 504}
+
+@app.post("/plan")
+async def plan(trip_info: TripInfo, deadline: float = PLAN_DEADLINE):
+    parts = {name: part async for name, part in _plan(trip_info, deadline)}
+    status = _plan_status(parts)
+    return JSONResponse(
+        status_code=PLAN_STATUS_CODES.get(status, 200),
+        content={"status": status, **parts}
+    )
+
+@app.post("/plan/stream")
+async def stream_plan(trip_info: TripInfo, deadline: float = PLAN_DEADLINE):
+    """
+    Stream the plan as Server-Sent Events: a "partial" event as each search
+    finishes, then a "result" event with the same body /plan returns.
+    """
+    async def event_generator():
+        yield {"event": "start", "data": json.dumps({"status": "running"})}
+        parts = {}
+        async for name, part in _plan(trip_info, deadline):
+            parts[name] = part
+            yield {"event": "partial", "data": json.dumps({"name": name, **part}, default=str)}
+        yield {
+            "event": "result",
+            "data": json.dumps({"status": _plan_status(parts), **parts}, default=str),
+        }
+
+    return EventSourceResponse(event_generator())
+
+def _submit_job(kind: str, func) -> JSONResponse:
+    endpoint = current_endpoint.get()
+
+    async def run_job():
+        # Workers don't inherit the submitting request's context
+        current_endpoint.set(endpoint)
+        return await func()
+
+    try:
+        job = job_queue.submit(kind, run_job)
+    except JobQueueFullError as e:
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": "30"},
+            content={"status": "rejected", "error": str(e)}
+        )
+    return JSONResponse(
+        status_code=202,
+        headers={"Location": f"/jobs/{job.id}"},
+        content={"status": job.status, "job_id": job.id}
+    )
+
+@app.post("/jobs/chat-history")
+async def submit_chat_history_job(chat_name: str, whatsapp_user_name: str):
+    loop_kwargs = _chat_history_loop_kwargs(chat_name, whatsapp_user_name)
+    if not_ready := await _clients_not_ready(loop_kwargs["client_list"]):
+        return not_ready
+    return _submit_job(
+        "chat-history",
+        lambda: _run_chat_history(chat_name, whatsapp_user_name, loop_kwargs),
+    )
+
+@app.post("/jobs/airbnb")
+async def submit_airbnb_job(trip_info: TripInfo):
+    loop_kwargs = _airbnb_loop_kwargs(trip_info)
+    if not_ready := await _clients_not_ready(loop_kwargs["client_list"]):
+        return not_ready
+    return _submit_job("airbnb", lambda: _run_airbnb(trip_info, loop_kwargs))
+
+@app.post("/jobs/activities")
+async def submit_activities_job(trip_info: TripInfo):
+    loop_kwargs = _activities_loop_kwargs(trip_info)
+    if not_ready := await _clients_not_ready(loop_kwargs["client_list"]):
+        return not_ready
+    return _submit_job("activities", lambda: _run_activities(trip_info, loop_kwargs))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Job status and result. With wait > 0 the request long-polls until the job finishes."""
+    job = await job_queue.get(job_id, wait=min(wait, 60))
+    if job is None:
+        return JSONResponse(status_code=404, content={"status": "not_found"})
+    return JSONResponse(status_code=200, content=job.to_dict())
+
+@app.get("/jobs")
+async def job_stats():
+    return JSONResponse(
+        status_code=200,
+        content=job_queue.stats()
+    )
+
+def _stream_agent_loop(loop_kwargs) -> EventSourceResponse:
+    """
+    Run an agent loop and stream its progress as Server-Sent Events.
+
+    Emits a "start" event right away, then "text", "tool_call_start" and "tool_call_end"
+    events as they happen, and finally a "result" event carrying the same JSON body the
+    non-streaming endpoint returns.
+    """
+    event_queue = asyncio.Queue()
+
+    async def run():
+        try:
+            state = {}
+            result = await mcp_host.process_input_with_agent_loop(
+                **loop_kwargs, event_queue=event_queue, state=state
+            )
+            if result:
+                await event_queue.put(
+                    {
+                        "event": "result",
+                        "data": {
+                            "status": "success",
+                            "result": result,
+                            "budget": state.get("budget"),
+                            "result_store": state.get("result_store"),
+                        },
+                    }
+                )
+            else:
+                await event_queue.put({"event": "result", "data": {"status": "error"}})
+        except Exception as e:
+            print(f"Error in streaming agent loop: {e}")
+            await event_queue.put({"event": "error", "data": {"status": "error"}})
+        finally:
+            await event_queue.put(None)
+
+    async def events():
+        task = asyncio.create_task(run())
+        try:
+            yield {"event": "start", "data": json.dumps({"status": "running"})}
+            while (event := await event_queue.get()) is not None:
+                yield {"event": event["event"], "data": json.dumps(event["data"], default=str)}
+        finally:
+            # Stop the agent loop if the client disconnects early
+            if not task.done():
+                task.cancel()
+
+    return EventSourceResponse(events())
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Serve one configured MCP server over streamable HTTP, so several app workers share it.
+
+The bridge spawns the server's stdio process pool once, keeps it warm with the
+usual health checks and forwards the tools and resources requests of every
+connected worker to it. Point the workers at it with <NAME>_MCP_SERVER_URL
+(or "url" in MCP_SERVERS_CONFIG) instead of letting each spawn its own server.
+
+Usage (from the backend directory):
+    python mcp_bridge.py Exa --port 8931
+    EXA_MCP_SERVER_URL=http://127.0.0.1:8931/mcp/ uvicorn main:app --workers 4
+"""
+import argparse
+import contextlib
+from typing import Optional
+import uvicorn
+from mcp import types
+from mcp.server.lowlevel import Server
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from mcp_client import MCPClient
+from mcp_servers import ConfiguredMCPClient, load_server_configs
+
+
+def create_bridge_server(client: MCPClient) -> Server:
+    """Low-level MCP server that answers every request with the client's upstream server"""
+    server = Server(f"{client.name.lower()}-bridge")
+
+    # Raw handlers rather than the decorators, so results (including isError) pass through
+    # unchanged. Errors of the upstream server reach the worker as the same McpError.
+    async def list_tools(request: types.ListToolsRequest) -> types.ServerResult:
+        # The client keeps the listing cached until the server reports a change
+        return types.ServerResult(types.ListToolsResult(tools=await client.get_tools()))
+
+    async def call_tool(request: types.CallToolRequest) -> types.ServerResult:
+        return types.ServerResult(
+            await client.call_tool(request.params.name, request.params.arguments)
+        )
+
+    async def list_resources(request: types.ListResourcesRequest) -> types.ServerResult:
+        return types.ServerResult(await client.list_resources())
+
+    async def read_resource(request: types.ReadResourceRequest) -> types.ServerResult:
+        return types.ServerResult(await client.read_resource(request.params.uri))
+
+    server.request_handlers[types.ListToolsRequest] = list_tools
+    server.request_handlers[types.CallToolRequest] = call_tool
+    server.request_handlers[types.ListResourcesRequest] = list_resources
+    server.request_handlers[types.ReadResourceRequest] = read_resource
+    return server
+
+
+def create_bridge_app(client: MCPClient, server_script_path: Optional[str]) -> Starlette:
+    session_manager = StreamableHTTPSessionManager(create_bridge_server(client))
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await client.connect_to_server(server_script_path)
+        try:
+            async with session_manager.run():
+                yield
+        finally:
+            await client.cleanup()
+
+    async def handle_mcp(scope, receive, send):
+        await session_manager.handle_request(scope, receive, send)
+
+    return Starlette(routes=[Mount("/mcp", app=handle_mcp)], lifespan=lifespan)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("server", help="Name of a configured MCP server, e.g. Exa")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8931)
+    parser.add_argument("--pool-size", type=int, default=None)
+    args = parser.parse_args()
+
+    config = load_server_configs()[args.server]
+    if config.resolved_transport != "stdio":
+        raise SystemExit(f"{args.server} is configured to connect to {config.url}, not to spawn a server")
+    client = ConfiguredMCPClient(config, pool_size=args.pool_size)
+    uvicorn.run(create_bridge_app(client, config.script), host=args.host, port=args.port)
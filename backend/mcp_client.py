@@ -1,42 +1,373 @@
+import asyncio
+import os
+import anyio
+import httpx
 from abc import ABC, abstractmethod
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncContextManager, Callable
 from contextlib import AsyncExitStack
+from datetime import timedelta
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from metrics import TOOL_LISTING_SECONDS
+from mcp.types import (
+    INTERNAL_ERROR,
+    CallToolResult,
+    ErrorData,
+    JSONRPCError,
+    ListResourcesResult,
+    ListToolsResult,
+    ReadResourceResult,
+    ServerNotification,
+    Tool,
+    ToolListChangedNotification,
+)
 
+# Number of server processes spawned per client
+MCP_SERVER_POOL_SIZE = int(os.getenv("MCP_SERVER_POOL_SIZE", "1"))
+# Seconds between health checks of the server processes in a pool
+MCP_HEALTH_CHECK_INTERVAL = float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "30"))
+# Seconds a server process has to answer a health check ping
+MCP_HEALTH_CHECK_TIMEOUT = float(os.getenv("MCP_HEALTH_CHECK_TIMEOUT", "5"))
+# Seconds to wait for requests other than tool calls (listing tools, reading resources).
+# Busy processes are not pinged, so a hung request must not keep its process busy for good.
+MCP_REQUEST_TIMEOUT = float(os.getenv("MCP_REQUEST_TIMEOUT", "30"))
+
+# Errors raised by a session whose transport is gone, e.g. because the server process died
+TRANSPORT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+
+
+def connection_error(name: str, message: str, code: int = INTERNAL_ERROR) -> McpError:
+    return McpError(ErrorData(code=code, message=f"{message} ({name} MCP server)"))
 
-class MCPClient(ABC):
-    """Abstract base class for MCP clients."""
 
-    def __init__(self, name: str):
-        # Initialize session and client objects
+class WatchedClientSession(ClientSession):
+    """ClientSession that reports when its transport closes instead of leaving requests hanging."""
+
+    def __init__(self, *args, on_close: Callable[[], None], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+        self.transport_closed = False
+
+    async def _receive_loop(self) -> None:
+        try:
+            await super()._receive_loop()
+            # The read stream ended without the session being closed: the server went away
+            self.transport_closed = True
+        finally:
+            # Fail the requests still waiting for a response now rather than at their read timeout
+            for request_id, stream in list(self._response_streams.items()):
+                error = ErrorData(code=INTERNAL_ERROR, message="Connection to the MCP server was closed")
+                try:
+                    stream.send_nowait(JSONRPCError(jsonrpc="2.0", id=request_id, error=error))
+                except (anyio.WouldBlock, *TRANSPORT_ERRORS):
+                    pass
+            self.on_close()
+
+
+class MCPServerProcess:
+    """
+    One MCP server connection and its ClientSession: a stdio subprocess, or a
+    connection to a long-lived server over SSE or streamable HTTP.
+
+    The transport and session contexts are entered and exited inside a dedicated
+    task, because anyio requires them to be closed from the task that opened them.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        open_transport: Callable[[], AsyncContextManager],
+        message_handler,
+        on_exit: Callable[[], None] = None,
+    ):
+        self.name = name
+        self.open_transport = open_transport
+        self.message_handler = message_handler
+        # Called when the server goes away on its own, rather than being stopped
+        self.on_exit = on_exit or (lambda: None)
         self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
+        self.in_flight = 0
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.session is not None
+            and self._task is not None
+            and not self._task.done()
+            and not self._stop.is_set()
+        )
+
+    async def start(self) -> None:
+        """Spawn the server process or connect to it, and wait for the session to be initialized"""
+        self._task = asyncio.create_task(self._run())
+        try:
+            await self._ready.wait()
+        except asyncio.CancelledError:
+            # Startup was abandoned (e.g. timed out): tear the half-started process down
+            self._task.cancel()
+            raise
+        if self._error:
+            raise self._error
+
+    async def _run(self) -> None:
+        try:
+            async with AsyncExitStack() as exit_stack:
+                # stdio and SSE yield (read, write); streamable HTTP adds a session id getter
+                streams = await exit_stack.enter_async_context(self.open_transport())
+                session = await exit_stack.enter_async_context(
+                    WatchedClientSession(
+                        streams[0],
+                        streams[1],
+                        message_handler=self.message_handler,
+                        # Also wakes up when the server goes away, so alive turns False at once
+                        on_close=self._stop.set,
+                    )
+                )
+                await session.initialize()
+                self.session = session
+                self._ready.set()
+                await self._stop.wait()
+                if session.transport_closed:
+                    print(f"Warning: MCP server process for {self.name} exited")
+                    self.on_exit()
+        except Exception as e:
+            self._error = e
+            print(f"Warning: MCP server process for {self.name} exited: {e}")
+            self.on_exit()
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def ping(self, timeout: float = MCP_HEALTH_CHECK_TIMEOUT) -> bool:
+        """Check that the server process still answers requests"""
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, MCP_HEALTH_CHECK_TIMEOUT)
+            except Exception:
+                self._task.cancel()
+
+
+class MCPClient(ABC):
+    """
+    Abstract base class for MCP clients.
+
+    Each client runs a pool of identical server processes. Requests are sent to
+    the least-loaded live process, and a background health check respawns
+    processes that die or stop answering pings.
+    """
+
+    def __init__(self, name: str, pool_size: int = None):
         self.name = name
+        self.pool_size = pool_size or MCP_SERVER_POOL_SIZE
+        self.processes: List[MCPServerProcess] = []
+        self.server_params: Optional[StdioServerParameters] = None
+        self._health_check_task: Optional[asyncio.Task] = None
+        self._health_check_wakeup = asyncio.Event()
+
+        # Startup state reported by the host: pending, starting, ready or failed
+        self.state = "pending"
+        self.error: Optional[str] = None
+
+        # Tools advertised by the server, cached per connection.
+        # tools_version is bumped whenever the cache is replaced or invalidated.
+        self.tools: Optional[List[Tool]] = None
+        self.tools_version = 0
 
     @abstractmethod
-    async def connect_to_server(self, server_script_path: str) -> None:
+    def get_server_parameters(self, server_script_path: str) -> StdioServerParameters:
         """
-        Connect to an MCP server
-        This is left unimplemented because each MCP client could have its own way of connecting to the server
+        Build the parameters used to spawn the MCP server
+        This is left unimplemented because each MCP client could have its own way of launching the server
 
         Args:
             server_script_path: Path to the server script (.py or .js)
         """
         pass
 
-    # In mcp_client.py
+    async def connect_to_server(self, server_script_path: str) -> None:
+        """
+        Spawn the pool of server processes and connect to each of them
+
+        Args:
+            server_script_path: Path to the server script (.py or .js)
+        """
+        self.server_params = self.get_server_parameters(server_script_path)
+        results = await asyncio.gather(
+            *(self._spawn_process() for _ in range(self.pool_size)),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # Don't leave the processes that did start running without an owner
+            await asyncio.gather(
+                *(result.stop() for result in results if isinstance(result, MCPServerProcess)),
+                return_exceptions=True,
+            )
+            raise errors[0]
+        self.processes = results
+
+        # List available tools
+        response = await self._list_tools()
+        tools = response.tools
+        self.cache_tools(tools)
+        print(
+            f"\nConnected to server {self.name} ({self.pool_size} process(es)) with tools: {[tool.name for tool in tools]}"
+        )
+
+        if self._health_check_task is None:
+            self._health_check_task = asyncio.create_task(self._health_check_loop())
+
+    def open_transport(self) -> AsyncContextManager:
+        """Transport of one pool member: a new stdio server process unless overridden"""
+        return stdio_client(self.server_params)
+
+    async def _spawn_process(self) -> MCPServerProcess:
+        process = MCPServerProcess(
+            self.name,
+            self.open_transport,
+            self.handle_message,
+            # Respawn a process that died while idle without waiting for the next scheduled check
+            on_exit=self._health_check_wakeup.set,
+        )
+        await process.start()
+        return process
+
+    @property
+    def session(self) -> Optional[ClientSession]:
+        """Session of the least-loaded live server process"""
+        live = [process for process in self.processes if process.alive]
+        if not live:
+            return None
+        return min(live, key=lambda process: process.in_flight).session
+
+    def _acquire_process(self) -> MCPServerProcess:
+        live = [process for process in self.processes if process.alive]
+        if not live:
+            self._health_check_wakeup.set()
+            raise connection_error(self.name, "No live server process")
+        return min(live, key=lambda process: process.in_flight)
+
+    async def _dispatch(self, method: str, *args) -> Any:
+        """Run a session method on the least-loaded live server process"""
+        process = self._acquire_process()
+        process.in_flight += 1
+        try:
+            return await getattr(process.session, method)(*args)
+        except TRANSPORT_ERRORS as e:
+            # Reported like any other failed request, e.g. to the model as a tool error
+            raise connection_error(self.name, "Connection to the server was lost") from e
+        finally:
+            process.in_flight -= 1
+            if not process.alive:
+                # Don't wait for the next scheduled check to replace it
+                self._health_check_wakeup.set()
+
+    async def call_tool(
+        self, name: str, arguments: Dict[str, Any] = None, timeout: float = None
+    ) -> CallToolResult:
+        """Call a tool, raising McpError if the server doesn't answer within timeout seconds"""
+        read_timeout = timedelta(seconds=timeout) if timeout else None
+        return await self._dispatch("call_tool", name, arguments, read_timeout)
+
+    async def _dispatch_with_timeout(self, method: str, *args) -> Any:
+        """_dispatch for session methods without a read timeout of their own"""
+        try:
+            return await asyncio.wait_for(self._dispatch(method, *args), MCP_REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise connection_error(
+                self.name, f"{method} timed out after {MCP_REQUEST_TIMEOUT:g}s",
+                # The code the MCP SDK uses for its own read timeouts
+                httpx.codes.REQUEST_TIMEOUT,
+            ) from None
+
+    async def read_resource(self, uri: str) -> ReadResourceResult:
+        return await self._dispatch_with_timeout("read_resource", uri)
+
+    async def list_resources(self) -> ListResourcesResult:
+        return await self._dispatch_with_timeout("list_resources")
+
+    async def _health_check_loop(self) -> None:
+        """Periodically ping every server process and respawn the ones that are gone"""
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._health_check_wakeup.wait(), MCP_HEALTH_CHECK_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._health_check_wakeup.clear()
+            await self.check_health()
+
+    async def check_health(self) -> None:
+        for i, process in enumerate(list(self.processes)):
+            # A server running a slow sync tool can't answer pings until it's done. Its calls
+            # have their own read timeout, and a process that died is no longer alive.
+            if process.alive and process.in_flight:
+                continue
+            if await process.ping():
+                continue
+            print(f"MCP server process {i} for {self.name} is unhealthy, respawning")
+            await process.stop()
+            try:
+                self.processes[i] = await self._spawn_process()
+            except Exception as e:
+                print(f"Warning: Failed to respawn MCP server process for {self.name}: {e}")
+
+    async def get_tools(self) -> List[Tool]:
+        """Return the server's tools, only listing them when the cache is empty"""
+        if self.tools is None:
+            response = await self._list_tools()
+            self.tools = response.tools
+        return self.tools
+
+    async def _list_tools(self) -> ListToolsResult:
+        with TOOL_LISTING_SECONDS.time(client=self.name):
+            return await self._dispatch_with_timeout("list_tools")
+
+    def cache_tools(self, tools: List[Tool]) -> None:
+        """Store the tools listed for a fresh connection"""
+        self.tools = tools
+        self.tools_version += 1
+
+    def invalidate_tools(self) -> None:
+        """Drop the cached tools so they are listed again on next use"""
+        self.tools = None
+        self.tools_version += 1
+
+    async def handle_message(self, message: Any) -> None:
+        """Message handler passed to ClientSession to react to server notifications"""
+        if isinstance(message, ServerNotification) and isinstance(
+            message.root, ToolListChangedNotification
+        ):
+            print(f"Tool list changed on server {self.name}, invalidating cache")
+            self.invalidate_tools()
+
     async def cleanup(self) -> None:
         """Clean up resources"""
         try:
-            if self.session:
-                # Try to explicitly close the session first
-                try:
-                    await self.session.shutdown()
-                except Exception as e:
-                    print(f"Warning: Error shutting down session for {self.name}: {e}")
+            if self._health_check_task:
+                self._health_check_task.cancel()
+                self._health_check_task = None
 
-            # Then close the exit stack
-            await self.exit_stack.aclose()
+            # Stop every server process in the pool
+            await asyncio.gather(
+                *(process.stop() for process in self.processes), return_exceptions=True
+            )
+            self.processes = []
         except Exception as e:
             print(f"Warning: Error during cleanup of {self.name}: {e}")
@@ -0,0 +1,159 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import AsyncContextManager, Dict, List, Optional
+from mcp import StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import get_default_environment
+from mcp.client.streamable_http import streamablehttp_client
+from mcp_client import MCPClient
+
+# Optional JSON file overriding the built-in server configs, e.g.
+# {"Exa": {"url": "http://127.0.0.1:8931/mcp/"}, "Maps": {"script": "/srv/maps/index.js"}}
+MCP_SERVERS_CONFIG = os.getenv("MCP_SERVERS_CONFIG")
+
+TRANSPORTS = ("stdio", "sse", "http")
+
+
+@dataclass
+class MCPServerConfig:
+    """How to reach one MCP server: a command to spawn over stdio, or the URL of a running server."""
+
+    name: str
+    # Server script passed to the command as its last argument
+    script: Optional[str] = None
+    # Executable; inferred from the script's extension (python or node) when not set
+    command: Optional[str] = None
+    args: List[str] = field(default_factory=list)
+    # Variables set for the server process
+    env: Dict[str, str] = field(default_factory=dict)
+    # Variables copied from this process's environment, on top of the MCP SDK's safe defaults
+    env_passthrough: List[str] = field(default_factory=list)
+    # Copy this process's whole environment instead, for servers that need more than a few variables
+    inherit_env: bool = False
+    # Virtual environment whose python runs the server
+    venv: Optional[str] = None
+    # URL of a long-lived server to connect to instead of spawning one
+    url: Optional[str] = None
+    # "stdio", "sse" or "http" (streamable HTTP); inferred from url when not set
+    transport: Optional[str] = None
+    # Connections kept to the server, MCP_SERVER_POOL_SIZE when not set
+    pool_size: Optional[int] = None
+    # Whether the app starts a client for the server; "enabled": false in MCP_SERVERS_CONFIG turns it off
+    enabled: bool = True
+
+    def __post_init__(self):
+        if self.transport is not None and self.transport not in TRANSPORTS:
+            raise ValueError(f"{self.name}: unknown transport {self.transport!r}, expected one of {TRANSPORTS}")
+        if self.resolved_transport != "stdio" and not self.url:
+            raise ValueError(f"{self.name}: the {self.transport} transport needs a url")
+
+    @property
+    def resolved_transport(self) -> str:
+        if self.transport:
+            return self.transport
+        if not self.url:
+            return "stdio"
+        return "sse" if self.url.rstrip("/").endswith("/sse") else "http"
+
+    def command_for(self, server_script_path: Optional[str]) -> str:
+        if self.command:
+            return self.command
+        if self.venv:
+            return os.path.join(self.venv, "bin", "python")
+        if server_script_path and server_script_path.endswith(".py"):
+            return "python"
+        if server_script_path and server_script_path.endswith(".js"):
+            return "node"
+        raise ValueError("Server script must be a .py or .js file")
+
+    def environment(self) -> Dict[str, str]:
+        """Environment of the spawned server, built from the config rather than a copy of os.environ"""
+        env = dict(os.environ) if self.inherit_env else get_default_environment()
+        env.update({name: os.environ[name] for name in self.env_passthrough if name in os.environ})
+        if self.venv:
+            # Some packages check VIRTUAL_ENV, and the venv's bin directory goes first on PATH
+            env["VIRTUAL_ENV"] = self.venv
+            env["PATH"] = f"{os.path.join(self.venv, 'bin')}:{env.get('PATH', '')}"
+            # PYTHONHOME can interfere with the venv
+            env.pop("PYTHONHOME", None)
+        env.update(self.env)
+        return env
+
+
+class ConfiguredMCPClient(MCPClient):
+    """MCP client whose server is described by an MCPServerConfig instead of a subclass."""
+
+    def __init__(self, config: MCPServerConfig, pool_size: int = None):
+        super().__init__(name=config.name, pool_size=pool_size or config.pool_size)
+        self.config = config
+
+    def get_server_parameters(self, server_script_path: Optional[str]) -> Optional[StdioServerParameters]:
+        """
+        Build the parameters used to spawn the MCP server; None when it runs elsewhere
+
+        Args:
+            server_script_path: Path to the server script (.py or .js), overriding the config's
+        """
+        if self.config.resolved_transport != "stdio":
+            return None
+        script = server_script_path or self.config.script
+        args = [*self.config.args, script] if script else list(self.config.args)
+        return StdioServerParameters(
+            command=self.config.command_for(script), args=args, env=self.config.environment()
+        )
+
+    def open_transport(self) -> AsyncContextManager:
+        transport = self.config.resolved_transport
+        if transport == "sse":
+            return sse_client(self.config.url)
+        if transport == "http":
+            return streamablehttp_client(self.config.url)
+        return super().open_transport()
+
+
+def default_server_configs() -> Dict[str, MCPServerConfig]:
+    return {
+        "Whatsapp": MCPServerConfig(
+            name="Whatsapp",
+            script=os.getenv("WHATSAPP_MCP_SERVER_PATH"),
+            venv=os.getenv("WHATSAPP_MCP_SERVER_VENV_PATH"),
+        ),
+        "Exa": MCPServerConfig(
+            name="Exa",
+            script=os.getenv("EXA_MCP_SERVER_PATH"),
+            env_passthrough=["EXA_API_KEY"],
+        ),
+        "Airbnb": MCPServerConfig(
+            name="Airbnb",
+            script=os.getenv("AIRBNB_MCP_SERVER_PATH"),
+        ),
+    }
+
+
+def server_url_variable(name: str) -> str:
+    """Environment variable that points a server's clients at a running server, e.g. EXA_MCP_SERVER_URL"""
+    return f"{name.upper()}_MCP_SERVER_URL"
+
+
+def enabled_server_names(configs: Dict[str, MCPServerConfig]) -> List[str]:
+    return [name for name, config in configs.items() if config.enabled]
+
+
+def load_server_configs(path: Optional[str] = MCP_SERVERS_CONFIG) -> Dict[str, MCPServerConfig]:
+    """
+    The built-in server configs, with fields overridden or servers added by the
+    optional JSON file, and the url of any server set by its <NAME>_MCP_SERVER_URL
+    """
+    configs = default_server_configs()
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        for name, fields in overrides.items():
+            base = asdict(configs[name]) if name in configs else {"name": name}
+            configs[name] = MCPServerConfig(**{**base, **fields})
+    for name, config in configs.items():
+        url = os.getenv(server_url_variable(name))
+        if url:
+            configs[name] = MCPServerConfig(**{**asdict(config), "url": url})
+    return configs
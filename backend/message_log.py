@@ -0,0 +1,99 @@
+from collections.abc import Sequence
+from typing import Any, Dict, List
+
+# Rough characters per token used for estimates, so compaction needs no extra API call
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(content: Any) -> int:
+    """Approximate token count of message content"""
+    if isinstance(content, str):
+        return len(content) // CHARS_PER_TOKEN
+    if isinstance(content, list):
+        total = 0
+        for block in content:
+            if isinstance(block, dict):
+                total += estimate_tokens(block.get("content", block.get("text", "")))
+            elif hasattr(block, "text"):
+                total += len(block.text) // CHARS_PER_TOKEN
+            elif hasattr(block, "input"):
+                total += len(str(block.input)) // CHARS_PER_TOKEN
+        return total
+    return len(str(content)) // CHARS_PER_TOKEN
+
+
+class MessageLog(Sequence):
+    """
+    Append-only conversation history shared by every turn of one agent loop.
+
+    Turns are appended as deltas (the assistant message and the tool results that
+    answer it), so the history is never copied while the loop runs. Stored
+    messages are never mutated in place; compaction may only swap an old message
+    for a shorter one with replace().
+
+    The estimated token count of the history is kept up to date as messages are
+    added or replaced, so checking it each turn doesn't rescan the whole history.
+    """
+
+    def __init__(self, input_action: str):
+        self._messages: List[Dict[str, Any]] = []
+        self._tokens: List[int] = []
+        self.estimated_tokens = 0
+        # Messages before this index have been compacted already
+        self.compacted_until = 0
+        self.append({"role": "user", "content": input_action})
+
+    def append(self, message: Dict[str, Any]) -> None:
+        tokens = estimate_tokens(message["content"])
+        self._messages.append(message)
+        self._tokens.append(tokens)
+        self.estimated_tokens += tokens
+
+    def append_turn(self, assistant_content: List[Any], tool_results: List[Dict]) -> None:
+        """Record one tool-using turn: the model's message and the user message with all tool results"""
+        self.append({"role": "assistant", "content": assistant_content})
+        self.append({"role": "user", "content": tool_results})
+
+    def replace(self, index: int, message: Dict[str, Any]) -> None:
+        tokens = estimate_tokens(message["content"])
+        self.estimated_tokens += tokens - self._tokens[index]
+        self._messages[index] = message
+        self._tokens[index] = tokens
+
+    @property
+    def entries(self) -> List[Dict[str, Any]]:
+        """The underlying list, for read-only consumers such as tracing"""
+        return self._messages
+
+    def with_last_message(self, last_message: Dict[str, Any]) -> "MessageLogView":
+        """View of the history with the newest message replaced, without copying the rest"""
+        return MessageLogView(self._messages, len(self._messages), last_message)
+
+    def __getitem__(self, index):
+        return self._messages[index]
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+
+class MessageLogView(Sequence):
+    """Read-only prefix of a MessageLog whose final message is swapped for another one."""
+
+    def __init__(self, messages: List[Dict[str, Any]], length: int, last_message: Dict[str, Any]):
+        self._messages = messages
+        self._length = length
+        self._last_message = last_message
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("MessageLogView index out of range")
+        if index == self._length - 1:
+            return self._last_message
+        return self._messages[index]
+
+    def __len__(self) -> int:
+        return self._length
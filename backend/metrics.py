@@ -0,0 +1,243 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Endpoint of the request being served, used as a metric label by code deep in the host
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="none")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels. Safe to update from any thread."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {value}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    """Histogram with fixed buckets and labels. Safe to update from any thread."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[i] += 1
+            self._values[key] = (bucket_counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall time spent in the with block, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = {
+                key: (list(bucket_counts), total, count)
+                for key, (bucket_counts, total, count) in self._values.items()
+            }
+        lines = []
+        for key, (bucket_counts, total, count) in sorted(values.items()):
+            # bucket_counts are already cumulative: every observation counts in all larger buckets
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                labels = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class RequestTimings:
+    """Wall time of one agent loop, split into model calls, tool calls and everything else."""
+
+    def __init__(self):
+        self.model_seconds = 0.0
+        self.tool_seconds = 0.0
+        self.tool_calls = 0
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def model(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.model_seconds += time.perf_counter() - start
+
+    @contextmanager
+    def tools(self, count: int) -> Iterator[None]:
+        """Time one turn's tool calls, which run concurrently"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tool_seconds += time.perf_counter() - start
+            self.tool_calls += count
+
+    @property
+    def total_seconds(self) -> float:
+        return time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, float]:
+        total = self.total_seconds
+        return {
+            "total_seconds": round(total, 4),
+            "model_seconds": round(self.model_seconds, 4),
+            "tool_seconds": round(self.tool_seconds, 4),
+            "other_seconds": round(total - self.model_seconds - self.tool_seconds, 4),
+            "tool_calls": self.tool_calls,
+        }
+
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "mcp_host_request_seconds",
+    "Wall time of HTTP requests",
+    ["endpoint", "status"],
+)
+AGENT_LOOP_SECONDS = REGISTRY.histogram(
+    "mcp_host_agent_loop_seconds",
+    "Wall time of process_input_with_agent_loop runs",
+    ["endpoint"],
+)
+MODEL_CALL_SECONDS = REGISTRY.histogram(
+    "mcp_host_model_call_seconds",
+    "Wall time of Anthropic messages calls",
+    ["endpoint", "model", "turn"],
+)
+TOOL_CALL_SECONDS = REGISTRY.histogram(
+    "mcp_host_tool_call_seconds",
+    "Wall time of tool calls, including the wait for a client slot",
+    ["endpoint", "client", "tool"],
+)
+TOOL_QUEUE_SECONDS = REGISTRY.histogram(
+    "mcp_host_tool_queue_seconds",
+    "Time tool calls wait for a free slot on their MCP client",
+    ["client"],
+)
+TOOL_LISTING_SECONDS = REGISTRY.histogram(
+    "mcp_host_tool_listing_seconds",
+    "Wall time of list_tools requests to MCP servers",
+    ["client"],
+)
+CLIENT_INIT_SECONDS = REGISTRY.histogram(
+    "mcp_host_client_init_seconds",
+    "Wall time of MCP client initialization",
+    ["client", "status"],
+)
+JOB_QUEUE_SECONDS = REGISTRY.histogram(
+    "mcp_host_job_queue_seconds",
+    "Time jobs wait in the job queue before a worker picks them up",
+    ["kind"],
+)
+TELEMETRY_EXPORT_SECONDS = REGISTRY.histogram(
+    "mcp_host_telemetry_export_seconds",
+    "Wall time of telemetry batch exports, e.g. Langfuse flushes",
+    ["exporter"],
+)
+RESULT_STORE_BYTES = REGISTRY.histogram(
+    "mcp_host_result_store_bytes",
+    "Tool result bytes held per agent loop: peak in memory, and spilled to disk",
+    ["endpoint", "location"],
+    buckets=[2**10, 2**14, 2**16, 2**18, 2**20, 2**22, 2**24, 2**26, 2**28],
+)
+TOKENS = REGISTRY.counter(
+    "mcp_host_tokens_total",
+    "Tokens used by Anthropic messages calls",
+    ["endpoint", "type"],
+)
@@ -0,0 +1,154 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+MODEL_LARGE = os.getenv("MODEL_LARGE", "claude-3-5-sonnet-20241022")
+MODEL_FAST = os.getenv("MODEL_FAST", "claude-3-5-haiku-20241022")
+MODEL_MAX_TOKENS = int(os.getenv("MODEL_MAX_TOKENS", "4096"))
+
+# Turn types of the agent loop
+TURN_PLAN = "plan"  # first turn, with server tools to choose from
+TURN_NO_TOOLS = "no_tools"  # first turn of a task without server tools, e.g. updating a summary
+TURN_FOLLOWUP = "followup"  # turn after tool results: next tool call or the final answer
+TURN_FINAL = "final"  # answer forced after the budget ran out
+
+# Tier ("large" or "fast"), model id, or "loop" for the model that answered the loop's
+# previous turn. Prompt caches are per model, so switching models mid-loop would throw
+# away the cache the first turn wrote; later turns stay on the loop's model, which is
+# the large one once a fast turn has been escalated.
+DEFAULT_MODEL_ROUTES = {
+    TURN_PLAN: "large",
+    TURN_NO_TOOLS: "fast",
+    TURN_FOLLOWUP: "loop",
+    TURN_FINAL: "loop",
+}
+# Per-task overrides, e.g. {"chat_history": {"followup": "fast"}}; "*" applies to every task.
+# Tasks are the logical jobs of the agent loop (airbnb, activities, chat_history), so a
+# rule covers every endpoint that runs the task: plain, streamed, as a job or inside /plan.
+MODEL_ROUTES: Dict[str, Dict[str, str]] = (
+    json.loads(os.getenv("MODEL_ROUTES")) if os.getenv("MODEL_ROUTES") else {}
+)
+
+
+def is_json_object(text: str) -> bool:
+    """The answer contains a JSON object, possibly wrapped in other text"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return False
+    try:
+        return isinstance(json.loads(text[start : end + 1]), dict)
+    except json.JSONDecodeError:
+        return False
+
+
+# Final answer each task asks for; a fast answer that doesn't meet it is escalated.
+# Tasks without a contract are only escalated when the answer is cut off.
+OUTPUT_CONTRACTS: Dict[str, Callable[[str], bool]] = {
+    "airbnb": is_json_object,
+    "activities": is_json_object,
+    # The prompt allows "Chat not found" instead of a summary
+    "chat_history": lambda text: is_json_object(text) or "chat not found" in text.lower(),
+}
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    name: str
+    task: Optional[str]
+    model: str
+    max_tokens: int
+    # Model to retry with when this one's answer doesn't hold up, if any
+    escalate_to: Optional[str] = None
+
+
+class RouteStats:
+    def __init__(self):
+        self.calls = 0
+        self.escalations = 0
+        self.seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "escalations": self.escalations,
+            "mean_seconds": round(self.seconds / self.calls, 4) if self.calls else 0.0,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+class ModelRouter:
+    """
+    Picks the model for each turn of the agent loop from its task and turn type.
+
+    Turns on the fast tier are escalated to the large model when the fast answer
+    is cut off or, for a final answer, doesn't meet the task's output contract.
+    By default a loop stays on the model of its first turn, so its prompt cache is reused.
+    Latency and token counts are kept per route.
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, Dict[str, str]] = None,
+        large_model: str = MODEL_LARGE,
+        fast_model: str = MODEL_FAST,
+        max_tokens: int = MODEL_MAX_TOKENS,
+    ):
+        self.routes = MODEL_ROUTES if routes is None else routes
+        self.large_model = large_model
+        self.fast_model = fast_model
+        self.max_tokens = max_tokens
+        self._stats: Dict[str, RouteStats] = {}
+
+    def route(self, task: Optional[str], turn: str, loop_model: Optional[str] = None) -> ModelRoute:
+        """Route a turn; loop_model is the model that answered the loop's previous turn"""
+        target = (
+            self.routes.get(task, {}).get(turn)
+            or self.routes.get("*", {}).get(turn)
+            or DEFAULT_MODEL_ROUTES[turn]
+        )
+        if target == "loop":
+            # A loop still on the fast model can escalate like any fast turn
+            target = "fast" if loop_model == self.fast_model else loop_model or "large"
+        if target == "fast":
+            model, escalate_to = self.fast_model, self.large_model
+        elif target == "large":
+            model, escalate_to = self.large_model, None
+        else:
+            model, escalate_to = target, None
+        return ModelRoute(
+            name=f"{task or 'default'}:{turn}",
+            task=task,
+            model=model,
+            max_tokens=self.max_tokens,
+            escalate_to=escalate_to if escalate_to != model else None,
+        )
+
+    def needs_escalation(self, route: ModelRoute, response: Any) -> bool:
+        if response.stop_reason == "max_tokens":
+            return True
+        if any(block.type == "tool_use" for block in response.content):
+            return False
+        contract = OUTPUT_CONTRACTS.get(route.task)
+        if contract is None:
+            return False
+        text = "".join(block.text for block in response.content if block.type == "text")
+        return not contract(text)
+
+    def record(self, route: ModelRoute, model: str, seconds: float, usage: Any, escalated: bool = False) -> None:
+        stats = self._stats.setdefault(f"{route.name}:{model}", RouteStats())
+        stats.calls += 1
+        stats.escalations += escalated
+        stats.seconds += seconds
+        stats.input_tokens += (
+            (usage.input_tokens or 0)
+            + (usage.cache_read_input_tokens or 0)
+            + (usage.cache_creation_input_tokens or 0)
+        )
+        stats.output_tokens += usage.output_tokens or 0
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.to_dict() for name, stats in sorted(self._stats.items())}
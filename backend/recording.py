@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections.abc import Sequence
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from anthropic.types import Message
+from mcp.types import CallToolResult, ListToolsResult, ReadResourceResult
+from mcp_client import MCPClient, connection_error
+from telemetry import json_default
+
+# "live" talks to the real services, "record" also writes every exchange to the
+# fixture file, "replay" serves the exchanges from the fixture file without any network
+TRAFFIC_MODE = os.getenv("TRAFFIC_MODE", "live")
+TRAFFIC_FIXTURE_PATH = os.getenv("TRAFFIC_FIXTURE_PATH", "traffic_fixture.json")
+# Replayed exchanges sleep for their recorded latency times this factor (0 = instant)
+REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "0"))
+
+# Result types of the MCP session methods that are recorded
+MCP_RESULT_TYPES = {
+    "call_tool": CallToolResult,
+    "list_tools": ListToolsResult,
+    "read_resource": ReadResourceResult,
+}
+
+
+def _canonical_default(value: Any) -> Any:
+    # Message histories are passed as MessageLog views rather than lists
+    if isinstance(value, Sequence):
+        return list(value)
+    return json_default(value)
+
+
+def request_key(kind: str, request: Any) -> str:
+    """Deterministic key of a request: its kind and canonicalized JSON body"""
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=_canonical_default)
+    return f"{kind}/{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+class MissingFixtureError(KeyError):
+    """Raised in replay mode when a request was never recorded"""
+
+
+class TrafficFixture:
+    """
+    Recorded request/response exchanges, keyed on the canonicalized request.
+
+    Identical requests recorded several times are replayed in order, cycling
+    when a run makes more of them than were recorded. The fixture also keeps
+    the agent loop inputs seen while recording, so they can be replayed as a
+    benchmark workload.
+    """
+
+    def __init__(self, path: str = TRAFFIC_FIXTURE_PATH):
+        self.path = path
+        self.exchanges: Dict[str, List[Dict[str, Any]]] = {}
+        self.scenarios: List[Dict[str, Any]] = []
+        self._replay_counts: Dict[str, int] = {}
+
+    @classmethod
+    def load(cls, path: str = TRAFFIC_FIXTURE_PATH) -> "TrafficFixture":
+        fixture = cls(path)
+        with open(path) as f:
+            data = json.load(f)
+        fixture.exchanges = data["exchanges"]
+        fixture.scenarios = data.get("scenarios", [])
+        return fixture
+
+    def save(self) -> None:
+        with open(self.path, "w") as f:
+            json.dump(
+                {"scenarios": self.scenarios, "exchanges": self.exchanges},
+                f,
+                default=json_default,
+            )
+
+    def record(self, kind: str, request: Any, response: Any, latency: float) -> None:
+        if hasattr(response, "model_dump"):
+            response = response.model_dump(mode="json")
+        self.exchanges.setdefault(request_key(kind, request), []).append(
+            {"response": response, "latency": latency}
+        )
+
+    def add_scenario(self, **loop_kwargs: Any) -> None:
+        if loop_kwargs not in self.scenarios:
+            self.scenarios.append(loop_kwargs)
+
+    def lookup(self, kind: str, request: Any) -> Dict[str, Any]:
+        key = request_key(kind, request)
+        recorded = self.exchanges.get(key)
+        if not recorded:
+            raise MissingFixtureError(f"No recorded {kind} exchange for request {key}")
+        count = self._replay_counts.get(key, 0)
+        self._replay_counts[key] = count + 1
+        return recorded[count % len(recorded)]
+
+
+async def _simulate_latency(exchange: Dict[str, Any], latency_scale: float) -> None:
+    if latency_scale:
+        await asyncio.sleep(exchange["latency"] * latency_scale)
+
+
+class _RecordingStream:
+    """Wraps a messages.stream() manager and records the final message"""
+
+    def __init__(self, manager, fixture: TrafficFixture, request: Dict[str, Any]):
+        self._manager = manager
+        self._fixture = fixture
+        self._request = request
+
+    async def __aenter__(self):
+        self._start = time.perf_counter()
+        self._stream = await self._manager.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._manager.__aexit__(*exc_info)
+
+    def __aiter__(self):
+        return self._stream.__aiter__()
+
+    async def get_final_message(self) -> Message:
+        message = await self._stream.get_final_message()
+        self._fixture.record(
+            "anthropic", self._request, message, time.perf_counter() - self._start
+        )
+        return message
+
+
+class _RecordingMessages:
+    def __init__(self, messages, fixture: TrafficFixture):
+        self._messages = messages
+        self._fixture = fixture
+
+    async def create(self, **request: Any) -> Message:
+        start = time.perf_counter()
+        message = await self._messages.create(**request)
+        self._fixture.record("anthropic", request, message, time.perf_counter() - start)
+        return message
+
+    def stream(self, **request: Any) -> _RecordingStream:
+        return _RecordingStream(self._messages.stream(**request), self._fixture, request)
+
+
+class RecordingAnthropic:
+    """Passes requests to a real Anthropic client and records every exchange"""
+
+    def __init__(self, client, fixture: TrafficFixture):
+        self._client = client
+        self.messages = _RecordingMessages(client.messages, fixture)
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+class _ReplayTextEvent:
+    type = "text"
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _ReplayStream:
+    """Stand-in for the stream of messages.stream(): one text event per text block"""
+
+    def __init__(self, message: Message):
+        self._message = message
+
+    async def __aiter__(self):
+        for block in self._message.content:
+            if block.type == "text":
+                yield _ReplayTextEvent(block.text)
+
+    async def get_final_message(self) -> Message:
+        return self._message
+
+
+class _ReplayMessages:
+    def __init__(self, fixture: TrafficFixture, latency_scale: float):
+        self._fixture = fixture
+        self._latency_scale = latency_scale
+
+    async def _replay(self, request: Dict[str, Any]) -> Message:
+        exchange = self._fixture.lookup("anthropic", request)
+        await _simulate_latency(exchange, self._latency_scale)
+        return Message.model_validate(exchange["response"])
+
+    async def create(self, **request: Any) -> Message:
+        return await self._replay(request)
+
+    def stream(self, **request: Any) -> "_ReplayStreamManager":
+        return _ReplayStreamManager(self, request)
+
+
+class _ReplayStreamManager:
+    def __init__(self, messages: _ReplayMessages, request: Dict[str, Any]):
+        self._messages = messages
+        self._request = request
+
+    async def __aenter__(self) -> _ReplayStream:
+        return _ReplayStream(await self._messages._replay(self._request))
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class ReplayAnthropic:
+    """Serves recorded Anthropic responses without touching the network"""
+
+    def __init__(self, fixture: TrafficFixture, latency_scale: float = REPLAY_LATENCY_SCALE):
+        self.messages = _ReplayMessages(fixture, latency_scale)
+
+    async def close(self) -> None:
+        pass
+
+
+def _mcp_request(client_name: str, method: str, args: tuple) -> Dict[str, Any]:
+    # Timeouts depend on the remaining budget, so they are not part of the request identity
+    return {
+        "client": client_name,
+        "method": method,
+        "args": [arg for arg in args if not isinstance(arg, timedelta)],
+    }
+
+
+def record_mcp_client(client: MCPClient, fixture: TrafficFixture) -> MCPClient:
+    """Record every session request the client sends to its server processes"""
+    dispatch = client._dispatch
+
+    async def recording_dispatch(method: str, *args) -> Any:
+        start = time.perf_counter()
+        result = await dispatch(method, *args)
+        fixture.record(
+            "mcp", _mcp_request(client.name, method, args), result, time.perf_counter() - start
+        )
+        return result
+
+    client._dispatch = recording_dispatch
+    return client
+
+
+class ReplayMCPClient(MCPClient):
+    """MCP client that serves recorded responses instead of spawning a server"""
+
+    def __init__(
+        self,
+        name: str,
+        fixture: TrafficFixture,
+        latency_scale: float = REPLAY_LATENCY_SCALE,
+    ):
+        super().__init__(name=name)
+        self.fixture = fixture
+        self.latency_scale = latency_scale
+
+    def get_server_parameters(self, server_script_path: str):
+        return None
+
+    async def connect_to_server(self, server_script_path: Optional[str]) -> None:
+        response = await self._list_tools()
+        self.cache_tools(response.tools)
+        print(f"\nReplaying server {self.name} with tools: {[tool.name for tool in response.tools]}")
+
+    async def _dispatch(self, method: str, *args) -> Any:
+        try:
+            exchange = self.fixture.lookup("mcp", _mcp_request(self.name, method, args))
+        except MissingFixtureError as e:
+            # Reported like a failed request to a live server, e.g. to the model as a tool error
+            raise connection_error(self.name, e.args[0]) from e
+        await _simulate_latency(exchange, self.latency_scale)
+        return MCP_RESULT_TYPES[method].model_validate(exchange["response"])
+
+    async def cleanup(self) -> None:
+        pass
@@ -0,0 +1,451 @@
+import json
+import mmap
+import os
+import re
+import tempfile
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+from compaction import binary_placeholder, content_text
+
+# Bytes of results a store keeps in memory; beyond it the oldest results spill to temp files
+RESULT_STORE_MEMORY_BYTES = int(os.getenv("RESULT_STORE_MEMORY_BYTES", str(4 * 2**20)))
+# Bytes of spilled results a store keeps on disk; beyond it the oldest results are dropped (0 for no limit)
+RESULT_STORE_DISK_BYTES = int(os.getenv("RESULT_STORE_DISK_BYTES", str(256 * 2**20)))
+# Directory for spill files, the system temp directory by default
+RESULT_STORE_SPILL_DIR = os.getenv("RESULT_STORE_SPILL_DIR")
+# Rough size of a parsed JSON tree relative to its text (about 3.4x for a listings payload in CPython)
+PARSED_TREE_SIZE_FACTOR = 3
+
+# Marks a path that doesn't resolve, since None is a valid JSON value
+MISSING = object()
+# Marks a result whose text isn't JSON
+NOT_JSON = object()
+
+Step = Tuple[str, Any]
+# A stored result is a list of text and binary parts
+Part = Union[str, bytes]
+
+_KEY = re.compile(r"[^.\[\]{}]+")
+_INDEX = re.compile(r"-?\d+")
+_SLICE = re.compile(r"(-?\d*):(-?\d*)(?::(-?\d+))?")
+_FILTER = re.compile(r"([^=!<>~]+?)\s*(==|!=|<=|>=|<|>|~)\s*(.+)")
+
+
+class PathSyntaxError(ValueError):
+    """Raised when an extract_path can't be parsed"""
+
+
+def _closing(path: str, start: int, closer: str) -> int:
+    """Index of the bracket closing the one at `start`, skipping quoted text"""
+    quote = None
+    for i in range(start + 1, len(path)):
+        char = path[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == closer:
+            return i
+    raise PathSyntaxError(f"Unclosed '{path[start]}' at position {start}")
+
+
+def _literal(text: str) -> Any:
+    """Value on the right of a filter: JSON (numbers, true, null, "text"), 'text' or a bare word"""
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == "'":
+        return text[1:-1]
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def _bracket(content: str) -> Step:
+    content = content.strip()
+    if content == "*":
+        return ("wildcard", None)
+    if content.startswith("?"):
+        condition = content[1:].strip()
+        match = _FILTER.fullmatch(condition)
+        if match:
+            field, op, value = match.groups()
+            return ("filter", (compile_path(field.strip()), op, _literal(value)))
+        if not condition:
+            raise PathSyntaxError("Empty filter")
+        # [?field] keeps the items where the field is present and truthy
+        return ("filter", (compile_path(condition), None, None))
+    if len(content) >= 2 and content[0] == content[-1] and content[0] in "'\"":
+        return ("key", content[1:-1])
+    if _INDEX.fullmatch(content):
+        return ("index", int(content))
+    match = _SLICE.fullmatch(content)
+    if match:
+        start, stop, step = (int(part) if part else None for part in match.groups())
+        if step == 0:
+            raise PathSyntaxError("Slice step cannot be zero")
+        return ("slice", slice(start, stop, step))
+    raise PathSyntaxError(f"Invalid selector [{content}]")
+
+
+@lru_cache(maxsize=256)
+def compile_path(path: str) -> Tuple[Step, ...]:
+    """
+    Parse an extract_path into steps. Supported syntax:
+
+        results.0.name          keys; a number is an index on lists
+        results[0], [-1]        indices
+        results[1:5], [::2]     slices
+        results[*].url, *.url   every item of a list, or every value of an object
+        results[?price<100]     filters: ==, !=, <, <=, >, >=, and ~ for "contains"
+        results[?url]           items where the field is present and truthy
+        results{name,price}     projection of fields, applied to each item of a list
+        ['key with.dots']       quoted keys
+
+    After a wildcard, slice or filter the rest of the path is applied to each item.
+    """
+    path = path.strip()
+    steps: List[Step] = []
+    i = 1 if path.startswith("$") else 0
+    while i < len(path):
+        char = path[i]
+        if char == ".":
+            i += 1
+        elif char == "[":
+            end = _closing(path, i, "]")
+            steps.append(_bracket(path[i + 1 : end]))
+            i = end + 1
+        elif char == "{":
+            end = _closing(path, i, "}")
+            fields = tuple(field.strip() for field in path[i + 1 : end].split(",") if field.strip())
+            if not fields:
+                raise PathSyntaxError("Empty projection")
+            steps.append(("project", tuple((field, compile_path(field)) for field in fields)))
+            i = end + 1
+        elif char in "]}":
+            raise PathSyntaxError(f"Unexpected '{char}' at position {i}")
+        else:
+            match = _KEY.match(path, i)
+            token = match.group().strip()
+            steps.append(("wildcard", None) if token == "*" else ("key", token))
+            i = match.end()
+    return tuple(steps)
+
+
+def _matches(item: Any, condition: Tuple[Tuple[Step, ...], str, Any]) -> bool:
+    field, op, expected = condition
+    value = evaluate(item, field)
+    if op is None:
+        return value is not MISSING and bool(value)
+    if value is MISSING:
+        return op == "!="
+    if op == "~":
+        if isinstance(value, str):
+            return str(expected).lower() in value.lower()
+        return isinstance(value, (list, dict)) and expected in value
+    if op == "==":
+        return value == expected
+    if op == "!=":
+        return value != expected
+    try:
+        if op == "<":
+            return value < expected
+        if op == "<=":
+            return value <= expected
+        if op == ">":
+            return value > expected
+        return value >= expected
+    except TypeError:
+        return False
+
+
+def evaluate(node: Any, steps: Tuple[Step, ...]) -> Any:
+    """Apply compiled path steps to a parsed JSON tree; MISSING if the path doesn't resolve"""
+    if not steps:
+        return node
+    kind, arg = steps[0]
+    rest = steps[1:]
+
+    if kind == "key":
+        if isinstance(node, dict):
+            return evaluate(node[arg], rest) if arg in node else MISSING
+        if isinstance(node, list) and _INDEX.fullmatch(arg):
+            kind, arg = "index", int(arg)
+        else:
+            return MISSING
+    if kind == "index":
+        if isinstance(node, list) and -len(node) <= arg < len(node):
+            return evaluate(node[arg], rest)
+        return MISSING
+    if kind == "project":
+        if isinstance(node, list):
+            items = [evaluate(item, steps[:1]) for item in node]
+            return evaluate([item for item in items if item is not MISSING], rest)
+        if not isinstance(node, dict):
+            return MISSING
+        projected = {}
+        for name, field in arg:
+            value = evaluate(node, field)
+            if value is not MISSING:
+                projected[name] = value
+        return evaluate(projected, rest)
+
+    # Wildcards, slices and filters fan out: the rest of the path applies to each item
+    if kind == "wildcard" and isinstance(node, dict):
+        items = list(node.values())
+    elif not isinstance(node, list):
+        return MISSING
+    elif kind == "wildcard":
+        items = node
+    elif kind == "slice":
+        items = node[arg]
+    else:
+        items = [item for item in node if _matches(item, arg)]
+    results = [evaluate(item, rest) for item in items]
+    return [result for result in results if result is not MISSING]
+
+
+def content_parts(content: Any) -> List[Part]:
+    """Split tool result content into text parts and raw binary parts"""
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return [bytes(content)]
+    if isinstance(content, list) and any(
+        isinstance(block, (bytes, bytearray, memoryview)) for block in content
+    ):
+        return [
+            bytes(block) if isinstance(block, (bytes, bytearray, memoryview)) else content_text([block])
+            for block in content
+        ]
+    return [content_text(content)]
+
+
+def _size(parts: List[Part]) -> int:
+    # Characters stand in for bytes of text; exact enough for a budget and avoids encoding large strings
+    return sum(len(part) for part in parts)
+
+
+class SpilledResult:
+    """A result written to an unlinked temp file and read back through mmap."""
+
+    def __init__(self, parts: List[Part], spill_dir: Optional[str] = None):
+        # Removed from the directory on creation, so the space is freed however the process exits
+        self._file = tempfile.TemporaryFile(dir=spill_dir)
+        self.layout: List[Tuple[int, int, bool]] = []  # (offset, length, is_text) per part
+        offset = 0
+        for part in parts:
+            data = part.encode() if isinstance(part, str) else part
+            self._file.write(data)
+            self.layout.append((offset, len(data), isinstance(part, str)))
+            offset += len(data)
+        self._file.flush()
+        self.size = offset
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if offset else None
+
+    def _read(self, offset: int, length: int) -> bytes:
+        return self._map[offset : offset + length] if length else b""
+
+    def parts(self) -> List[Part]:
+        return [
+            self._read(offset, length).decode() if is_text else self._read(offset, length)
+            for offset, length, is_text in self.layout
+        ]
+
+    def text(self) -> str:
+        """Text of the result; binary parts are described rather than read from disk"""
+        return "\n".join(
+            self._read(offset, length).decode() if is_text else binary_placeholder(length)
+            for offset, length, is_text in self.layout
+        )
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+class ToolResultStore(MutableMapping):
+    """
+    Tool results of one agent loop, keyed by tool_use id.
+
+    Behaves like the dict it replaces. Results are held as text and raw bytes;
+    once they exceed memory_limit bytes, the oldest spill to memory-mapped temp
+    files, and results larger than the limit go straight to disk. Beyond
+    disk_limit the oldest spilled results are dropped.
+
+    Parsed JSON trees of referenced results are kept in an LRU cache, so
+    repeated references don't re-parse the whole payload. A tree is several times
+    the size of its text, so its estimated size counts against memory_limit too:
+    older trees are dropped first, then results spill, and a tree that can't fit
+    at all is parsed for the one reference and not kept.
+    """
+
+    def __init__(
+        self,
+        results: Mapping[str, Any] = None,
+        memory_limit: int = RESULT_STORE_MEMORY_BYTES,
+        disk_limit: int = RESULT_STORE_DISK_BYTES,
+        spill_dir: Optional[str] = RESULT_STORE_SPILL_DIR,
+    ):
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.spill_dir = spill_dir
+        # Insertion order of every result, oldest first, with its size
+        self._sizes: Dict[str, int] = {}
+        self._memory: Dict[str, List[Part]] = {}
+        self._spilled: Dict[str, SpilledResult] = {}
+        # Least recently referenced first, with the estimated size of each tree
+        self._trees: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self.tree_bytes = 0
+        self.memory_bytes = 0
+        self.peak_memory_bytes = 0
+        self.disk_bytes = 0
+        self.spills = 0
+        self.dropped = 0
+        self.parses = 0
+        if results:
+            self.update(results)
+
+    def __contains__(self, tool_id: object) -> bool:
+        # Without it, MutableMapping would read spilled results back from disk
+        return tool_id in self._sizes
+
+    def __getitem__(self, tool_id: str) -> Any:
+        if tool_id in self._memory:
+            parts = self._memory[tool_id]
+        else:
+            parts = self._spilled[tool_id].parts()
+        return parts[0] if len(parts) == 1 and isinstance(parts[0], str) else parts
+
+    def __setitem__(self, tool_id: str, content: Any) -> None:
+        if tool_id in self._sizes:
+            del self[tool_id]
+        parts = content_parts(content)
+        size = _size(parts)
+        self._sizes[tool_id] = size
+        if size > self.memory_limit:
+            self._spill(tool_id, parts)
+        else:
+            self._memory[tool_id] = parts
+            self.memory_bytes += size
+        self._enforce_limits()
+
+    def __delitem__(self, tool_id: str) -> None:
+        size = self._sizes.pop(tool_id)
+        self._drop_tree(tool_id)
+        if tool_id in self._memory:
+            del self._memory[tool_id]
+            self.memory_bytes -= size
+        else:
+            spilled = self._spilled.pop(tool_id)
+            self.disk_bytes -= spilled.size
+            spilled.close()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sizes)
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def _spill(self, tool_id: str, parts: List[Part]) -> None:
+        spilled = SpilledResult(parts, self.spill_dir)
+        self._spilled[tool_id] = spilled
+        self.disk_bytes += spilled.size
+        self.spills += 1
+
+    def _drop_tree(self, tool_id: str) -> None:
+        if tool_id in self._trees:
+            self.tree_bytes -= self._trees.pop(tool_id)[1]
+
+    def _drop_trees(self) -> None:
+        self._trees.clear()
+        self.tree_bytes = 0
+
+    def _enforce_limits(self) -> None:
+        # Trees are cheaper to rebuild than results are to read back, so they go first,
+        # except the most recently referenced one, which never exceeds the limit alone
+        while self.memory_bytes + self.tree_bytes > self.memory_limit and len(self._trees) > 1:
+            self._drop_tree(next(iter(self._trees)))
+        while self.memory_bytes + self.tree_bytes > self.memory_limit and self._memory:
+            tool_id = next(iter(self._memory))
+            parts = self._memory.pop(tool_id)
+            self.memory_bytes -= self._sizes[tool_id]
+            self._spill(tool_id, parts)
+        self.peak_memory_bytes = max(self.peak_memory_bytes, self.memory_bytes + self.tree_bytes)
+        # Keep the newest spilled result even if it alone exceeds the disk limit
+        while self.disk_limit and self.disk_bytes > self.disk_limit and len(self._spilled) > 1:
+            del self[next(tool_id for tool_id in self._sizes if tool_id in self._spilled)]
+            self.dropped += 1
+
+    def absorb(self, other: "ToolResultStore") -> None:
+        """Move every result of `other` into this store without reading spilled results back"""
+        for tool_id in list(other._sizes):
+            if tool_id in self._sizes:
+                del self[tool_id]
+            size = other._sizes.pop(tool_id)
+            self._sizes[tool_id] = size
+            if tool_id in other._memory:
+                self._memory[tool_id] = other._memory.pop(tool_id)
+                self.memory_bytes += size
+            else:
+                spilled = other._spilled.pop(tool_id)
+                self._spilled[tool_id] = spilled
+                self.disk_bytes += spilled.size
+        other._drop_trees()
+        other.memory_bytes = other.disk_bytes = 0
+        self._enforce_limits()
+
+    def text(self, tool_id: str) -> str:
+        if tool_id in self._memory:
+            return content_text(self._memory[tool_id])
+        return self._spilled[tool_id].text()
+
+    def tree(self, tool_id: str) -> Any:
+        """The result parsed as JSON, or NOT_JSON"""
+        if tool_id in self._trees:
+            self._trees.move_to_end(tool_id)
+            return self._trees[tool_id][0]
+        self.parses += 1
+        try:
+            tree = json.loads(self.text(tool_id))
+        except (json.JSONDecodeError, TypeError):
+            tree = NOT_JSON
+        size = 0 if tree is NOT_JSON else PARSED_TREE_SIZE_FACTOR * self._sizes[tool_id]
+        if size <= self.memory_limit:
+            self._trees[tool_id] = (tree, size)
+            self.tree_bytes += size
+            self._enforce_limits()
+        return tree
+
+    def extract(self, tool_id: str, path: str = None) -> str:
+        """The result's text, or the JSON found at `path` in it"""
+        if not path:
+            return self.text(tool_id)
+        try:
+            steps = compile_path(path)
+        except PathSyntaxError as e:
+            return f"Cannot extract path: {e}"
+        tree = self.tree(tool_id)
+        if tree is NOT_JSON:
+            return "Cannot extract path: result is not valid JSON"
+        data = evaluate(tree, steps)
+        if data is MISSING:
+            return "Path not found in data"
+        return json.dumps(data)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "results": len(self),
+            "memory_bytes": self.memory_bytes,
+            "tree_bytes": self.tree_bytes,
+            "peak_memory_bytes": self.peak_memory_bytes,
+            "disk_bytes": self.disk_bytes,
+            "spilled": self.spills,
+            "dropped": self.dropped,
+        }
+
+    def close(self) -> None:
+        """Delete every result, closing their spill files"""
+        for tool_id in list(self._sizes):
+            del self[tool_id]
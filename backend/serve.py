@@ -0,0 +1,85 @@
+"""
+Run the app with several uvicorn worker processes.
+
+Every worker builds its own MCPHost in the lifespan hook and starts its MCP
+clients in the background. With --share-mcp-servers, one mcp_bridge.py process
+is started per enabled stdio MCP server first, and the workers connect to those
+over HTTP instead of each spawning their own servers.
+
+Per-worker state: request coalescing, the in-memory tool result cache and model
+route stats are kept by each worker. Jobs are shared through JOB_SQLITE_PATH,
+which defaults to jobs.db when running several workers, and chat summaries
+through CHAT_SUMMARY_SQLITE_PATH. Set TOOL_CACHE_SQLITE_PATH to share the tool
+result cache too.
+
+Usage (from the backend directory):
+    python serve.py --workers 4 --share-mcp-servers
+"""
+import argparse
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import List
+import uvicorn
+from dotenv import load_dotenv
+
+# Before the imports below read their settings, and inherited by the bridges and workers
+load_dotenv()
+
+from mcp_servers import load_server_configs, server_url_variable
+
+# Seconds to wait for the MCP bridges to accept connections before starting the workers
+BRIDGE_STARTUP_TIMEOUT = float(os.getenv("BRIDGE_STARTUP_TIMEOUT", "60"))
+
+
+def wait_for_port(host: str, port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection((host, port), 0.5):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def start_bridges(first_port: int) -> List[subprocess.Popen]:
+    """Start a bridge for every enabled stdio server and point the workers at it"""
+    bridges = []
+    for offset, (name, config) in enumerate(load_server_configs().items()):
+        if not config.enabled or config.resolved_transport != "stdio" or not config.script:
+            continue
+        port = first_port + offset
+        bridges.append(
+            subprocess.Popen([sys.executable, "mcp_bridge.py", name, "--port", str(port)])
+        )
+        if wait_for_port("127.0.0.1", port, BRIDGE_STARTUP_TIMEOUT):
+            # Inherited by the worker processes, whose configs then use the bridge
+            os.environ[server_url_variable(name)] = f"http://127.0.0.1:{port}/mcp/"
+            print(f"Sharing the {name} MCP server across workers on port {port}")
+        else:
+            print(f"Warning: MCP bridge for {name} did not start, workers will spawn their own servers")
+    return bridges
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--share-mcp-servers", action="store_true")
+    parser.add_argument("--bridge-port", type=int, default=8931, help="Port of the first MCP bridge")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        os.environ.setdefault("JOB_SQLITE_PATH", "jobs.db")
+
+    bridges = start_bridges(args.bridge_port) if args.share_mcp_servers else []
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        for bridge in bridges:
+            bridge.terminate()
+        for bridge in bridges:
+            bridge.wait()
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+# Seconds a finished result is reused for identical requests (0 disables reuse)
+COALESCE_RESULT_TTL = float(os.getenv("COALESCE_RESULT_TTL", "30"))
+COALESCE_MAX_RESULTS = int(os.getenv("COALESCE_MAX_RESULTS", "256"))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller starts the work in its own task and every caller with the same
+    key awaits that task, so a caller disconnecting doesn't cancel it for the others.
+    Successful (truthy) results are kept for a short TTL to cover immediate repeats.
+    """
+
+    def __init__(self, result_ttl: float = COALESCE_RESULT_TTL, max_results: int = COALESCE_MAX_RESULTS):
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self.coalesced = 0
+        self.cache_hits = 0
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        # key -> (expires_at, result)
+        self._results: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self._results.get(key)
+        if cached:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                self.cache_hits += 1
+                return result
+            del self._results[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._execute(key, func))
+            self._in_flight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _execute(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await func()
+            if result and self.result_ttl:
+                self._results[key] = (time.monotonic() + self.result_ttl, result)
+                while len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._in_flight),
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "cached_results": len(self._results),
+        }
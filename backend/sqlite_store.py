@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class SQLiteKeyValueStore:
+    """
+    String values in one table of a SQLite file, keyed by string.
+
+    Entries expire at their expires_at (never if None) and, when max_entries is
+    set, only the most recently used ones are kept. Several processes can share
+    the file. This is the on-disk layer of the tool result cache, the job queue
+    and the chat summaries.
+    """
+
+    def __init__(self, path: str, table: str, max_entries: Optional[int] = None):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        # Calls come from worker threads via asyncio.to_thread, so share one connection under a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            now = time.time()
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            if self.max_entries:
+                self._conn.execute(
+                    f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str, expires_at: Optional[float] = None) -> None:
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+            if self.max_entries:
+                self._conn.execute(
+                    f"""
+                    DELETE FROM {self.table} WHERE key NOT IN (
+                        SELECT key FROM {self.table} ORDER BY last_access DESC LIMIT ?
+                    )
+                    """,
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
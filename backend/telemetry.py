@@ -0,0 +1,167 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+from langfuse.decorators import langfuse_context
+from metrics import TELEMETRY_EXPORT_SECONDS
+
+# Which exporter receives telemetry batches: "langfuse", "file" or "noop".
+# Defaults to langfuse when its keys are configured, otherwise noop.
+TELEMETRY_EXPORTER = os.getenv(
+    "TELEMETRY_EXPORTER", "langfuse" if os.getenv("LANGFUSE_PUBLIC_KEY") else "noop"
+)
+TELEMETRY_FILE_PATH = os.getenv("TELEMETRY_FILE_PATH", "telemetry.jsonl")
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "10000"))
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "100"))
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "5"))
+
+
+def json_default(value: Any) -> Any:
+    """Serialize pydantic models (e.g. Anthropic content blocks) as dicts, anything else as str"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+class NoopExporter:
+    """Discards every batch, for offline runs without a tracing backend."""
+
+    def export(self, batch: List[Dict[str, Any]]) -> None:
+        pass
+
+
+class FileExporter:
+    """Appends every event as one JSON line to a local file."""
+
+    def __init__(self, path: str = TELEMETRY_FILE_PATH):
+        self.path = path
+
+    def export(self, batch: List[Dict[str, Any]]) -> None:
+        with open(self.path, "a") as f:
+            for event in batch:
+                f.write(json.dumps(event, default=json_default) + "\n")
+
+
+class LangfuseExporter:
+    """
+    Turns events into Langfuse observations and flushes the client once per batch.
+
+    Model turns become generations and tool calls become spans, attached to the
+    trace and observation that were current when the event was recorded.
+    """
+
+    def export(self, batch: List[Dict[str, Any]]) -> None:
+        langfuse = langfuse_context.client_instance
+        for event in batch:
+            if event["type"] == "generation":
+                langfuse.generation(
+                    trace_id=event["trace_id"],
+                    parent_observation_id=event["parent_observation_id"],
+                    name="_create_claude_message",
+                    start_time=event["start_time"],
+                    end_time=event["end_time"],
+                    model=event["model"],
+                    input=event["input"],
+                    output=event["output"],
+                    usage_details=event["usage_details"],
+                )
+            elif event["type"] == "tool":
+                langfuse.span(
+                    trace_id=event["trace_id"],
+                    parent_observation_id=event["parent_observation_id"],
+                    name=event["name"],
+                    start_time=event["start_time"],
+                    end_time=event["end_time"],
+                    input=event["input"],
+                    output=event["output"],
+                )
+        langfuse_context.flush()
+
+
+def create_exporter(name: str = TELEMETRY_EXPORTER):
+    if name == "langfuse":
+        return LangfuseExporter()
+    if name == "file":
+        return FileExporter()
+    if name == "noop":
+        return NoopExporter()
+    raise ValueError(f"Unknown telemetry exporter: {name}")
+
+
+class TelemetryPipeline:
+    """
+    Bounded queue of telemetry events exported in batches by a background thread.
+
+    record() never blocks: when the queue is full the event is dropped and counted.
+    A batch is exported once it reaches batch_size events or flush_interval seconds
+    have passed since the last export, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        exporter=None,
+        queue_size: int = TELEMETRY_QUEUE_SIZE,
+        batch_size: int = TELEMETRY_BATCH_SIZE,
+        flush_interval: float = TELEMETRY_FLUSH_INTERVAL,
+    ):
+        self.exporter = exporter or create_exporter()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.exported = 0
+        self.export_errors = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="telemetry-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def record(self, event_type: str, **fields: Any) -> None:
+        """Queue an event for export, dropping it if the queue is full"""
+        try:
+            self._queue.put_nowait({"type": event_type, "timestamp": time.time(), **fields})
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while not (self._stop.is_set() and self._queue.empty()):
+            # Wake up at least every 100ms so close() doesn't wait a full interval
+            timeout = min(max(deadline - time.monotonic(), 0.01), 0.1)
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._export(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        self._export(batch)
+
+    def _export(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        try:
+            with TELEMETRY_EXPORT_SECONDS.time(exporter=type(self.exporter).__name__):
+                self.exporter.export(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            self.export_errors += 1
+            print(f"Warning: Error exporting telemetry batch: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "export_errors": self.export_errors,
+        }
+
+    def close(self, timeout: float = 10) -> None:
+        """Export what is still queued and stop the background thread"""
+        self._stop.set()
+        self._thread.join(timeout)
@@ -1,11 +1,11 @@
-from host import MCPHost, ENABLED_CLIENTS
+from host import MCPHost
 from dotenv import load_dotenv
 import asyncio
 from datetime import datetime
 
 load_dotenv()
 
-mcp_host = MCPHost(enabled_clients=ENABLED_CLIENTS)
+mcp_host = MCPHost()
 
 async def test_chat_history(chat_name: str):
     await mcp_host.initialize_mcp_clients()
@@ -31,12 +31,16 @@ async def test_chat_history(chat_name: str):
     """
 
     client_list = ["Whatsapp"]
-    result = await mcp_host.process_input_with_agent_loop(
-        input_action=input_action,
-        system_prompt=system_prompt,
-        client_list=client_list,
-        langfuse_session_id=f"chat-history-{chat_name}-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
-    )
+    try:
+        result = await mcp_host.process_input_with_agent_loop(
+            input_action=input_action,
+            system_prompt=system_prompt,
+            client_list=client_list,
+            langfuse_session_id=f"chat-history-{chat_name}-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
+        )
+    finally:
+        # Stops the MCP servers and, with TRAFFIC_MODE=record, saves the fixture
+        await mcp_host.cleanup()
 
     print(result)
 
@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+from mcp.types import Tool
+from mcp_client import MCPClient
+from tool_selection import BM25Index, ToolSelection, tool_document
+
+
+@dataclass(frozen=True)
+class ToolCatalogEntry:
+    """Prebuilt tool view for one subset of clients.
+
+    Entries are never modified after they are built, so a request can hold on to
+    one for its whole agent loop and route tool calls through it without locks.
+    """
+
+    server_tools: List[Tool]
+    anthropic_tools: List[Dict]
+    tool_to_client_map: Mapping[str, str]
+    # Relevance index over server_tools, in the same order
+    tool_index: BM25Index
+
+    def select(self, task: str) -> ToolSelection:
+        """Start a per-request selection of the tools most relevant to the task"""
+        server_count = len(self.server_tools)
+        return ToolSelection(
+            self.anthropic_tools[:server_count],
+            self.anthropic_tools[server_count:],
+            self.tool_index,
+            task,
+        )
+
+
+class ToolCatalog:
+    """
+    Cache of the tools exposed by each MCP client.
+
+    Tools are listed once per client connection (the clients cache the listing made
+    when they connect) and the Anthropic tool dicts are built once per subset of
+    clients. An entry is rebuilt only when one of its clients reconnects or
+    reports that its tool list changed, which bumps that client's tools_version.
+    """
+
+    def __init__(self, mcp_clients: Dict[str, MCPClient], extra_tools: List[Dict]):
+        self.mcp_clients = mcp_clients
+        self.extra_tools = extra_tools
+        self._entries: Dict[
+            Optional[FrozenSet[str]], Tuple[Tuple[int, ...], ToolCatalogEntry]
+        ] = {}
+
+    async def get(self, client_list: List[str] = None) -> ToolCatalogEntry:
+        """Return the tools for the given clients (all clients if None, none if empty).
+
+        The returned lists are shared between requests and must not be mutated.
+        """
+        key = None if client_list is None else frozenset(client_list)
+        client_names = [
+            name for name in self.mcp_clients if key is None or name in key
+        ]
+        versions = tuple(self.mcp_clients[name].tools_version for name in client_names)
+
+        cached = self._entries.get(key)
+        if cached and cached[0] == versions:
+            return cached[1]
+
+        entry = await self._build(client_names)
+        # Store against the versions we started with so a change during the build
+        # makes the next lookup rebuild again
+        self._entries[key] = (versions, entry)
+        return entry
+
+    async def _build(self, client_names: List[str]) -> ToolCatalogEntry:
+        server_tools: List[Tool] = []
+        tool_to_client_map: Dict[str, str] = {}
+
+        for client_name in client_names:
+            for tool in await self.mcp_clients[client_name].get_tools():
+                server_tools.append(tool)
+                # Map this tool name to the client that provides it
+                tool_to_client_map[tool.name] = client_name
+
+        anthropic_tools = [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "input_schema": tool.inputSchema,
+            }
+            for tool in server_tools
+        ] + self.extra_tools
+
+        tool_index = BM25Index(
+            [
+                tool_document(tool.name, tool.description, tool.inputSchema)
+                for tool in server_tools
+            ]
+        )
+
+        return ToolCatalogEntry(
+            server_tools=server_tools,
+            anthropic_tools=anthropic_tools,
+            tool_to_client_map=MappingProxyType(tool_to_client_map),
+            tool_index=tool_index,
+        )
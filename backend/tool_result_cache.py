@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from mcp.types import CallToolResult
+from sqlite_store import SQLiteKeyValueStore
+
+# Tools whose results may be cached, as "<client>/<tool>" or "<client>/*", mapped to a TTL in seconds.
+# Whatsapp is left out on purpose: chat history changes between calls.
+DEFAULT_TOOL_CACHE_TTLS = {
+    "Exa/*": 3600,
+    "Airbnb/*": 900,
+}
+TOOL_CACHE_TTLS: Dict[str, float] = (
+    json.loads(os.getenv("TOOL_CACHE_TTLS"))
+    if os.getenv("TOOL_CACHE_TTLS")
+    else DEFAULT_TOOL_CACHE_TTLS
+)
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1000"))
+TOOL_CACHE_MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Optional path to a SQLite file that keeps cached results across restarts
+TOOL_CACHE_SQLITE_PATH = os.getenv("TOOL_CACHE_SQLITE_PATH")
+
+
+def make_cache_key(client_name: str, tool_name: str, tool_args: Dict[str, Any]) -> str:
+    """Content address for a tool call: client, tool and canonicalized arguments"""
+    canonical_args = json.dumps(
+        tool_args or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    digest = hashlib.sha256(canonical_args.encode("utf-8")).hexdigest()
+    return f"{client_name}/{tool_name}/{digest}"
+
+
+class MemoryCacheBackend:
+    """In-memory LRU store bounded by entry count and total serialized size."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+        # key -> (expires_at, serialized result)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, value)
+        self.total_bytes += len(value)
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self.total_bytes -= len(value)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ToolResultCache:
+    """
+    Cache of MCP tool results keyed on (client, tool name, canonicalized args).
+
+    Only tools in the TTL allowlist are cached and error results are never stored.
+    Lookups go to the in-memory LRU first, then to the optional SQLite store.
+    """
+
+    def __init__(
+        self,
+        ttls: Dict[str, float] = None,
+        max_entries: int = TOOL_CACHE_MAX_ENTRIES,
+        max_bytes: int = TOOL_CACHE_MAX_BYTES,
+        sqlite_path: str = TOOL_CACHE_SQLITE_PATH,
+    ):
+        self.ttls = TOOL_CACHE_TTLS if ttls is None else ttls
+        self.memory = MemoryCacheBackend(max_entries, max_bytes)
+        self.disk = (
+            SQLiteKeyValueStore(sqlite_path, "tool_results", max_entries) if sqlite_path else None
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get_ttl(self, client_name: str, tool_name: str) -> Optional[float]:
+        """TTL for a tool, or None if its results must not be cached"""
+        ttl = self.ttls.get(f"{client_name}/{tool_name}")
+        if ttl is None:
+            ttl = self.ttls.get(f"{client_name}/*")
+        return ttl
+
+    async def get(
+        self, client_name: str, tool_name: str, tool_args: Dict[str, Any]
+    ) -> Optional[CallToolResult]:
+        if not self.get_ttl(client_name, tool_name):
+            return None
+
+        key = make_cache_key(client_name, tool_name, tool_args)
+        value = self.memory.get(key)
+        if value is None and self.disk:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                # Promote to memory so repeats skip the disk
+                self.memory.set(key, value, time.time() + self.get_ttl(client_name, tool_name))
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CallToolResult.model_validate_json(value)
+
+    async def set(
+        self,
+        client_name: str,
+        tool_name: str,
+        tool_args: Dict[str, Any],
+        result: CallToolResult,
+    ) -> None:
+        ttl = self.get_ttl(client_name, tool_name)
+        if not ttl or result.isError:
+            return
+
+        key = make_cache_key(client_name, tool_name, tool_args)
+        value = result.model_dump_json()
+        expires_at = time.time() + ttl
+        self.memory.set(key, value, expires_at)
+        if self.disk:
+            await asyncio.to_thread(self.disk.set, key, value, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.memory),
+            "bytes": self.memory.total_bytes,
+            "evictions": self.memory.evictions,
+            "sqlite_path": self.disk.path if self.disk else None,
+        }
+
+    def close(self) -> None:
+        if self.disk:
+            self.disk.close()
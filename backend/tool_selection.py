@@ -0,0 +1,150 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set
+
+# Server tools sent to the model up front; the rest are offered through list_more_tools (0 sends all)
+TOOL_SELECTION_TOP_K = int(os.getenv("TOOL_SELECTION_TOP_K", "8"))
+# Tools returned and unlocked by one list_more_tools call
+TOOL_SELECTION_PAGE_SIZE = int(os.getenv("TOOL_SELECTION_PAGE_SIZE", "10"))
+
+LIST_MORE_TOOLS_NAME = "list_more_tools"
+
+LIST_MORE_TOOLS = {
+    "name": LIST_MORE_TOOLS_NAME,
+    "description": (
+        "Only the tools most relevant to the task are shown. Call this tool when none of "
+        "them fit what you need to do: it lists more tools, and every tool it lists can be "
+        "called from the next turn on."
+    ),
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "Optional description of the capability you are looking for",
+            },
+        },
+    },
+}
+
+# BM25 parameters: term frequency saturation and document length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can for from if in is it of on or that the this to use using "
+    "with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, splitting snake_case and camelCase identifiers.
+
+    Stopwords are dropped and a trailing plural "s" is stripped, so "chats" matches "chat".
+    """
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text or "")
+    tokens = []
+    for token in re.split(r"[^a-z0-9]+", text.lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def tool_document(name: str, description: str, input_schema: Dict) -> List[str]:
+    """Tokens a tool is indexed under: its name (counted twice), description and parameter names"""
+    parameters = " ".join((input_schema or {}).get("properties", {}).keys())
+    return tokenize(name) * 2 + tokenize(description) + tokenize(parameters)
+
+
+class BM25Index:
+    """BM25 index over a fixed list of documents, built once and queried many times."""
+
+    def __init__(self, documents: Sequence[List[str]]):
+        self.term_frequencies = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        document_frequencies = Counter(
+            term for frequencies in self.term_frequencies for term in frequencies
+        )
+        count = len(documents)
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequencies.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        query_terms = [term for term in set(tokenize(query)) if term in self.idf]
+        scores = []
+        for frequencies, length in zip(self.term_frequencies, self.lengths):
+            score = 0.0
+            normalization = BM25_K1 * (
+                1 - BM25_B + BM25_B * length / (self.average_length or 1)
+            )
+            for term in query_terms:
+                frequency = frequencies.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (BM25_K1 + 1) / (frequency + normalization)
+            scores.append(score)
+        return scores
+
+    def rank(self, query: str) -> List[int]:
+        """Document indexes from most to least relevant; ties keep the original order"""
+        scores = self.scores(query)
+        return sorted(range(len(scores)), key=lambda i: -scores[i])
+
+
+class ToolSelection:
+    """
+    The tools one agent loop sends to the model.
+
+    Starts with the top_k server tools that rank highest against the task, plus the
+    host's own tools and list_more_tools. Tools listed by list_more_tools are added
+    for the rest of the loop. Tool calls are routed through the full catalog, so a
+    tool the model calls without having been shown still works.
+    """
+
+    def __init__(
+        self,
+        server_tools: List[Dict],
+        extra_tools: List[Dict],
+        index: BM25Index,
+        task: str,
+        top_k: int = TOOL_SELECTION_TOP_K,
+        page_size: int = TOOL_SELECTION_PAGE_SIZE,
+    ):
+        self.server_tools = server_tools
+        self.extra_tools = extra_tools
+        self.index = index
+        self.page_size = page_size
+        self.enabled = bool(top_k) and len(server_tools) > top_k
+        ranked = index.rank(task) if self.enabled else range(len(server_tools))
+        self.selected: Set[int] = set(list(ranked)[:top_k] if self.enabled else ranked)
+        self._build()
+
+    def _build(self) -> None:
+        # Keep catalog order so identical selections produce identical, cacheable prompts
+        tools = [tool for i, tool in enumerate(self.server_tools) if i in self.selected]
+        tools += self.extra_tools
+        if self.enabled and len(self.selected) < len(self.server_tools):
+            tools.append(LIST_MORE_TOOLS)
+        self.anthropic_tools = tools
+
+    def list_more(self, query: Optional[str]) -> str:
+        """Describe and unlock the next most relevant tools that haven't been shown yet"""
+        ranked = self.index.rank(query) if query else range(len(self.server_tools))
+        page = [i for i in ranked if i not in self.selected][: self.page_size]
+        if not page:
+            return "There are no more tools."
+        self.selected.update(page)
+        self._build()
+        lines = [
+            f"- {self.server_tools[i]['name']}: {self.server_tools[i]['description']}"
+            for i in page
+        ]
+        return "These tools can be called from now on:\n" + "\n".join(lines)
@@ -0,0 +1,57 @@
+from typing import Any, Dict
+
+# Cache reads are billed at 10% of the base input price and cache writes at 125%
+CACHE_READ_PRICE_RATIO = 0.1
+CACHE_WRITE_PRICE_RATIO = 1.25
+
+
+class RequestUsage:
+    """Token usage accumulated over every model turn of one agent loop."""
+
+    def __init__(self):
+        self.turns = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+
+    def add(self, usage: Any) -> None:
+        """Add the usage block of one Anthropic response"""
+        self.turns += 1
+        self.input_tokens += usage.input_tokens or 0
+        self.output_tokens += usage.output_tokens or 0
+        self.cache_creation_input_tokens += usage.cache_creation_input_tokens or 0
+        self.cache_read_input_tokens += usage.cache_read_input_tokens or 0
+
+    @property
+    def total_input_tokens(self) -> int:
+        """Input tokens processed, whether uncached, written to or read from the cache"""
+        return (
+            self.input_tokens
+            + self.cache_creation_input_tokens
+            + self.cache_read_input_tokens
+        )
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        total = self.total_input_tokens
+        return self.cache_read_input_tokens / total if total else 0.0
+
+    @property
+    def saved_input_tokens(self) -> float:
+        """Input tokens saved by caching, in base-price token equivalents"""
+        return (
+            self.cache_read_input_tokens * (1 - CACHE_READ_PRICE_RATIO)
+            - self.cache_creation_input_tokens * (CACHE_WRITE_PRICE_RATIO - 1)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_creation_input_tokens": self.cache_creation_input_tokens,
+            "cache_read_input_tokens": self.cache_read_input_tokens,
+            "cache_hit_ratio": round(self.cache_hit_ratio, 4),
+            "saved_input_tokens": round(self.saved_input_tokens),
+        }